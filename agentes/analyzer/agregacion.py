@@ -0,0 +1,91 @@
+import os
+import numpy as np
+from utils.jsonl import LECTORES, iterar_lineas
+from utils.serializacion import decodificar
+from agentes.analyzer.checkpoint import huella_archivo
+
+CATEGORIAS = ["salud", "educación", "infraestructura"]
+MONTOS = ("presupuesto", "valor_adj")
+
+def _monto(valor) -> float:
+    try:
+        return float(valor)
+    except (TypeError, ValueError):
+        return np.nan
+
+def _ruta_columnas(path: str) -> str:
+    base = path[:-len(".jsonl")] if path.endswith(".jsonl") else path
+    return f"{base}.columnas.npz"
+
+def leer_columnas(path: str, moneda_defecto: str | None = None) -> dict:
+    """
+    Carga un JSONL clasificado en arreglos tipados:
+    - categoria: código int8 (posición en CATEGORIAS, -1 para otras),
+    - moneda: código int16 sobre la lista 'monedas',
+    - presupuesto y valor_adj: float64, NaN si faltan o no son numéricos.
+    Los registros sin moneda toman moneda_defecto. Las columnas se guardan junto al JSONL
+    y se reutilizan mientras el archivo no cambie.
+    """
+    cache_path = _ruta_columnas(path)
+    huella = huella_archivo(path)
+    if os.path.exists(cache_path):
+        with np.load(cache_path, allow_pickle=False) as datos:
+            if str(datos["huella"]) == huella and str(datos["moneda_defecto"]) == str(moneda_defecto):
+                return {
+                    "categoria": datos["categoria"],
+                    "moneda": datos["moneda"],
+                    "monedas": [str(m) for m in datos["monedas"]],
+                    **{campo: datos[campo] for campo in MONTOS},
+                }
+
+    codigos_categoria = {c: i for i, c in enumerate(CATEGORIAS)}
+    codigos_moneda = {}
+    categoria, moneda = [], []
+    montos = {campo: [] for campo in MONTOS}
+    for line in iterar_lineas(path, workers=LECTORES):
+        if not line.strip():
+            continue
+        registro = decodificar(line)
+        categoria.append(codigos_categoria.get((registro.get("categoria") or "").lower(), -1))
+        codigo = (registro.get("moneda") or moneda_defecto or "").strip().upper()
+        moneda.append(codigos_moneda.setdefault(codigo, len(codigos_moneda)))
+        for campo in MONTOS:
+            montos[campo].append(_monto(registro.get(campo)))
+
+    columnas = {
+        "categoria": np.array(categoria, dtype=np.int8),
+        "moneda": np.array(moneda, dtype=np.int16),
+        "monedas": list(codigos_moneda),
+        **{campo: np.array(montos[campo], dtype=np.float64) for campo in MONTOS},
+    }
+    tmp_path = f"{cache_path}.tmp.npz"
+    np.savez(
+        tmp_path, huella=huella, moneda_defecto=str(moneda_defecto),
+        monedas=np.array(columnas["monedas"], dtype=str), categoria=columnas["categoria"],
+        moneda=columnas["moneda"], **{campo: columnas[campo] for campo in MONTOS}
+    )
+    os.replace(tmp_path, cache_path)
+    return columnas
+
+def agregar(columnas: dict, tasas: dict[str, float]) -> dict:
+    """
+    Suma los montos por (categoría, moneda) con un solo bincount y después convierte esa
+    matriz pequeña a USD con la tasa de cada moneda: equivale a convertir registro a registro
+    sin indexar las tasas por cada fila. tasas debe tener una tasa por cada moneda de columnas['monedas'].
+    Retorna {"presupuesto": {cat: usd}, "valor_adj": {cat: usd}, "registros": {cat: n}}.
+    """
+    monedas = columnas["monedas"]
+    num_monedas = max(1, len(monedas))
+    tasa = np.array([tasas[m] for m in monedas] or [0.0], dtype=np.float64)
+    # Fila 0 para las categorías que no se reportan (-1)
+    grupo = (columnas["categoria"].astype(np.intp) + 1) * num_monedas + columnas["moneda"]
+    celdas = (len(CATEGORIAS) + 1) * num_monedas
+    resultado = {}
+    for campo in MONTOS:
+        montos = columnas[campo]
+        sumas = np.bincount(grupo, weights=np.where(np.isnan(montos), 0.0, montos), minlength=celdas)
+        usd = sumas.reshape(-1, num_monedas)[1:] @ tasa
+        resultado[campo] = {cat: float(usd[i]) for i, cat in enumerate(CATEGORIAS)}
+    conteo = np.bincount(grupo, minlength=celdas).reshape(-1, num_monedas)[1:].sum(axis=1)
+    resultado["registros"] = {cat: int(conteo[i]) for i, cat in enumerate(CATEGORIAS)}
+    return resultado
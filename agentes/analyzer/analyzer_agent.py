@@ -1,12 +1,23 @@
 import os
 import json
-from agents import Agent, function_tool, Runner
+from agents import Agent, function_tool
 from typing import TypedDict
 from tqdm import tqdm
 import re
+import time
 import asyncio
-
-save_lock = asyncio.Lock()
+from utils.jsonl import leer_meta
+from utils.cache_clasificacion import CacheClasificacion
+from utils.concurrencia import ErrorEtapa, en_hilo
+from utils.tasas_cambio import ProveedorTasas
+from utils.resultados import AlmacenResultados
+from utils.planificador_llm import ejecutar_agente, PRIORIDAD_ALTA, PRIORIDAD_BAJA
+from agentes.analyzer.dedup import agrupar_objetos, escribir_clasificados
+from agentes.analyzer.lotes import armar_lotes, proyectar, unir_por_id
+from agentes.analyzer.checkpoint import CheckpointClasificacion, huella_archivo
+from agentes.analyzer.reglas import ClasificadorReglas, REGLAS_PATH
+from agentes.analyzer import vecinos
+from agentes.analyzer.agregacion import agregar, leer_columnas
 
 class NormalizedRecord(TypedDict):
     id: str
@@ -22,159 +33,252 @@ class NormalizedRecord(TypedDict):
     valor_adj: float
     justificacion: str
 
-async def get_usd_rate(moneda: str) -> float:
-    result = await Runner.run(currency_agent, input=moneda)
-    output = result.output if hasattr(result, "output") else str(result)
-    # Primer bloque JSON en la respuesta
-    match = re.search(r"\{.*?\}", output, re.DOTALL)
+class TasaUSD(TypedDict):
+    moneda: str
+    usd_rate: float
+
+async def consultar_tasa(moneda: str, fecha: str) -> float:
+    """
+    Pregunta al agente de monedas; solo se llama cuando la cache de tasas no tiene la moneda.
+    """
+    result = await ejecutar_agente(currency_agent, f"{moneda} {fecha}", prioridad=PRIORIDAD_ALTA)
+    return result.final_output["usd_rate"]
+
+_tasas = None
+
+def proveedor_tasas() -> ProveedorTasas:
+    global _tasas
+    if _tasas is None:
+        _tasas = ProveedorTasas(consultar_tasa)
+    return _tasas
+
+async def get_usd_rate(moneda: str, fecha: str | None = None) -> float:
+    """
+    Tasa USD de la moneda; lanza ErrorTasaCambio si no hay una confiable en vez de asumir 1.0.
+    """
+    return await proveedor_tasas().obtener(moneda, fecha)
+
+def parse_classification(result):
+    """
+    Extrae la lista JSON de la respuesta del clasificador; retorna None si no se puede leer.
+    """
+    output = str(getattr(result, "final_output", result))
+    match = re.search(r"\[\s*{.*?}\s*\]", output, re.DOTALL)
     if match:
         json_str = match.group(0)
     else:
         json_str = output.strip()
     try:
-        rate_info = json.loads(json_str)
-        return float(rate_info.get("usd_rate", 1.0))
+        items = json.loads(json_str)
+        return items if isinstance(items, list) else None
     except Exception as e:
-        print(f"[get_usd_rate] Error: {e}\nOutput: {json_str}")
-        return 1.0
+        print(f"[parse_classification] Error parsing output: {e}\nOutput: {json_str}")
+        return None
 
-def save_classification(result, pais: str, mode: str = "a"):
+async def clasificar_pais(pais: str) -> str:
+    """
+    Clasifica los objetos del dataset normalizado del país y escribe data/analiced/clasified/{pais}.jsonl.
+    Si no puede dejar el archivo clasificado lanza ErrorEtapa.
+    """
+    cache = None
     try:
         pais = pais.lower()
-        analiced_dir = "data/analiced"
-        clasified_dir = os.path.join(analiced_dir, "clasified")
-        os.makedirs(analiced_dir, exist_ok=True)
-        os.makedirs(clasified_dir, exist_ok=True)
-        output_path = os.path.join(clasified_dir, f"{pais}.jsonl")
-
-        output = result.output if hasattr(result, "output") else str(result)
-        match = re.search(r"\[\s*{.*?}\s*\]", output, re.DOTALL)
-        if match:
-            json_str = match.group(0)
-        else:
-            json_str = output.strip()
-        try:
-            items = json.loads(json_str)
-            with open(output_path, mode, encoding="utf-8") as f:
-                for obj in items:
-                    f.write(json.dumps(obj, ensure_ascii=False) + "\n")
-        except Exception as e:
-            print(f"[save_classification] Error parsing output: {e}\nOutput: {json_str}")
-    except Exception as e:
-        print(f"[save_classification] Error: {e}")
-
-@function_tool
-async def classify_country(pais: str) -> str:
-    try:
-        pais = pais.lower()
-        input_path = f"data/normalized/{pais}.json"
+        input_path = f"data/normalized/{pais}.jsonl"
+        output_path = f"data/analiced/clasified/{pais}.jsonl"
         if not os.path.exists(input_path):
-            return f"No existe el archivo para el país: {pais}"
-        with open(input_path, "r", encoding="utf-8") as f:
-            data = json.load(f)
-        num_registros = len(data)
-        batch_size = 50 if num_registros > 10000 else 30
-        total_batches = (len(data) + batch_size - 1) // batch_size
-
-        semaphore = asyncio.Semaphore(10)
-
-        pbar = tqdm(total=total_batches, desc=f"Analizando {pais}")
-
-        async def process_batch(idx, batch):
-            async with semaphore:
-                result = await Runner.run(
-                    classifier_agent, input=json.dumps(batch, ensure_ascii=False)
-                )
-                mode = "w" if idx == 0 else "a"
-                async with save_lock:
-                    save_classification(result, pais, mode)
-                pbar.update(1)
+            raise ErrorEtapa(f"No existe el archivo para el país: {pais}")
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+
+        # Cada objeto distinto se clasifica una sola vez
+        grupos, num_registros = await en_hilo(agrupar_objetos, input_path)
+        reduccion = num_registros / len(grupos) if grupos else 1.0
+        print(f"[classify_country] {pais}: {num_registros} registros, {len(grupos)} objetos distintos (x{reduccion:.1f})")
+
+        # Los objetos obvios por vocabulario no pasan por el modelo
+        etiquetas = {}
+        if os.path.exists(REGLAS_PATH):
+            etiquetas, stats = ClasificadorReglas.desde_archivo(REGLAS_PATH).clasificar_muchos(grupos)
+            print(
+                f"[classify_country] {pais}: reglas etiquetaron {stats['etiquetados']}/{stats['total']} objetos "
+                f"({stats['cobertura']:.0%}) a {stats['por_segundo']:,.0f} objetos/s"
+            )
 
-        tasks = []
-        for idx, i in enumerate(range(0, len(data), batch_size)):
-            batch = data[i:i+batch_size]
-            tasks.append(process_batch(idx, batch))
+        por_reglas = len(etiquetas)
+        fuentes = dict.fromkeys(etiquetas, "reglas")
 
-        await asyncio.gather(*tasks)
+        cache = CacheClasificacion()
+        claves_cache = {texto: cache.clave(texto) for texto in grupos if texto not in etiquetas}
+        conocidas = cache.obtener(list(claves_cache.values()))
+        desde_cache = {texto: conocidas[clave] for texto, clave in claves_cache.items() if clave in conocidas}
+        etiquetas.update(desde_cache)
+        fuentes.update(dict.fromkeys(desde_cache, "cache"))
+
+        # Objetos casi idénticos a otros que el modelo ya etiquetó toman la categoría del vecino
+        por_vecinos = 0
+        if vecinos.disponible():
+            restantes = [texto for texto in grupos if texto not in etiquetas]
+            inicio = time.perf_counter()
+            cercanos = await en_hilo(vecinos.predecir, restantes)
+            segundos = time.perf_counter() - inicio
+            etiquetas.update(cercanos)
+            fuentes.update(dict.fromkeys(cercanos, "vecino"))
+            por_vecinos = len(cercanos)
+            print(
+                f"[classify_country] {pais}: vecinos etiquetaron {por_vecinos}/{len(restantes)} objetos "
+                f"a {len(restantes) / segundos if segundos > 0 else 0:,.0f} objetos/s"
+            )
+
+        # Plan de lotes reanudable: si una ejecución anterior se cortó, solo se envían los lotes que faltan
+        checkpoint = CheckpointClasificacion(f"data/analiced/clasified/{pais}.checkpoint", huella_archivo(input_path))
+        plan = checkpoint.cargar_plan()
+        if plan is None:
+            pendientes = [(texto, objeto) for texto, objeto in grupos.items() if texto not in etiquetas]
+            # Solo se envía id + objeto, empaquetados por presupuesto de tokens
+            textos_por_id = {str(i): texto for i, (texto, _) in enumerate(pendientes)}
+            items = [proyectar(str(i), objeto) for i, (_, objeto) in enumerate(pendientes)]
+            plan = checkpoint.guardar_plan(armar_lotes(items), textos_por_id)
+        textos_por_id = plan["textos"]
+        lotes = plan["lotes"]
+        completados = checkpoint.completados()
+        if completados:
+            print(f"[classify_country] {pais}: reanudando, {len(completados)}/{len(lotes)} lotes ya terminados")
+        for id_item, categoria in checkpoint.resultados().items():
+            etiquetas[textos_por_id[id_item]] = categoria
+            fuentes[textos_por_id[id_item]] = "modelo"
+
+        # La concurrencia y los límites de tasa los controla el planificador global
+        pbar = tqdm(total=len(lotes), initial=len(completados), desc=f"Analizando {pais}")
+        llamadas = 0
+
+        async def process_batch(lote, idx=None):
+            nonlocal llamadas
+            result = await ejecutar_agente(
+                classifier_agent, json.dumps(lote, ensure_ascii=False), prioridad=PRIORIDAD_BAJA
+            )
+            llamadas += 1
+            categorias = unir_por_id(parse_classification(result), lote)
+            nuevas = {textos_por_id[id_item]: categoria for id_item, categoria in categorias.items()}
+            etiquetas.update(nuevas)
+            fuentes.update(dict.fromkeys(nuevas, "modelo"))
+            # Al reanudar, el plan guardado puede traer textos que esta ejecución ya no buscó en la cache
+            cache.guardar({cache.clave(texto): categoria for texto, categoria in nuevas.items()})
+            if idx is not None:
+                checkpoint.guardar_lote(idx, categorias)
+                pbar.update(1)
+
+        resultados = await asyncio.gather(*(
+            process_batch(lote, idx) for idx, lote in enumerate(lotes) if idx not in completados
+        ), return_exceptions=True)
         pbar.close()
-        return f"Análisis de {pais} completado."
+        errores = [r for r in resultados if isinstance(r, Exception)]
+        if errores:
+            print(f"[classify_country] {pais}: {len(errores)} lotes fallaron, el primero con: {errores[0]}")
+            raise ErrorEtapa(
+                f"Clasificación de {pais} interrumpida: {len(errores)} de {len(lotes)} lotes fallaron. "
+                f"Los lotes terminados quedaron guardados; vuelve a ejecutar para reanudar."
+            )
+
+        faltantes = [item for lote in lotes for item in lote if textos_por_id[item["id"]] not in etiquetas]
+        if faltantes:
+            # Un reintento para los ids que el modelo omitió o no pudo leer
+            print(f"[classify_country] {len(faltantes)} objetos sin respuesta del modelo, reintentando...")
+            await asyncio.gather(*(process_batch(lote) for lote in armar_lotes(faltantes)), return_exceptions=True)
+
+        if vecinos.disponible():
+            # Las etiquetas del modelo (nuevas o de cache) alimentan el índice para las próximas ejecuciones
+            aprendidas = {texto: etiquetas[texto] for texto, fuente in fuentes.items() if fuente in vecinos.FUENTES_ENTRENAMIENTO}
+            await en_hilo(vecinos.aprender, aprendidas)
+
+        escritos, sin_etiqueta = await en_hilo(escribir_clasificados, input_path, output_path, etiquetas, fuentes)
+        resumen = (
+            f"{num_registros} registros, {len(grupos)} objetos distintos (x{reduccion:.1f}), "
+            f"{por_reglas} por reglas, cache {cache.hits} hits, {por_vecinos} por vecinos, "
+            f"{llamadas} llamadas al modelo, {sin_etiqueta} sin clasificar"
+        )
+        print(f"[classify_country] {pais}: {resumen}")
+        checkpoint.limpiar()
+        return f"Análisis de {pais} completado: {resumen}."
+    finally:
+        if cache is not None:
+            cache.cerrar()
+    
+async def analizar_pais(pais: str) -> str:
+    """
+    Suma en USD los montos clasificados del país y los guarda en el almacén de resultados.
+    Si falta el archivo clasificado lanza ErrorEtapa.
+    """
+    pais = pais.lower()
+    clasified_path = f"data/analiced/clasified/{pais}.jsonl"
+
+    if not os.path.exists(clasified_path):
+        raise ErrorEtapa(f"No existe el archivo clasificado para {pais}")
+
+    # Moneda del dataset para los registros que no traen la suya
+    meta = leer_meta(f"data/normalized/{pais}.jsonl")
+    moneda = meta.get("moneda") or "USD"
+    columnas = await en_hilo(leer_columnas, clasified_path, moneda)
+
+    # Cada registro se convierte con la tasa de su propia moneda
+    monedas = columnas["monedas"]
+    tasas = dict(zip(monedas, await asyncio.gather(*(get_usd_rate(m) for m in monedas))))
+    totales = agregar(columnas, tasas)
+
+    # Upsert atómico por país: varios análisis en paralelo no se pisan
+    almacen = AlmacenResultados()
+    try:
+        await en_hilo(
+            almacen.guardar, pais, totales,
+            anio=meta.get("anio"),
+            busqueda=meta.get("busqueda"),
+            registros_normalizados=meta.get("total"),
+            registros_clasificados=len(columnas["categoria"]),
+            tasas=tasas,
+        )
+    finally:
+        almacen.cerrar()
+
+    return f"Análisis de {pais} completado. Resultados guardados en {almacen.path}"
+
+@function_tool
+async def classify_country(pais: str) -> str:
+    try:
+        return await clasificar_pais(pais)
+    except ErrorEtapa as e:
+        return str(e)
     except Exception as e:
         print(f"[classify_country] Error: {e}")
         return f"Error al analizar {pais}: {e}"
-    
+
 @function_tool
-async def analyze_country(pais: str):
+async def analyze_country(pais: str) -> str:
     try:
-        pais = pais.lower()
-        clasified_path = f"data/analiced/clasified/{pais}.jsonl"
-        analysis_path = "data/analiced/analisis.json"
-        categorias = ["salud", "educación", "infraestructura"]
-        acumulados = {cat: 0.0 for cat in categorias}
-
-        os.makedirs(os.path.dirname(analysis_path), exist_ok=True)
-
-        normalized_path = f"data/normalized/{pais}.json"
-        moneda = "USD"
-        if os.path.exists(normalized_path):
-            with open(normalized_path, "r", encoding="utf-8") as f:
-                data = json.load(f)
-                if data and isinstance(data, list):
-                    moneda = data[0].get("moneda", "USD")
-                                         
-        if os.path.exists(clasified_path):
-            with open(clasified_path, "r", encoding="utf-8") as f:
-                for line in f:
-                    try:
-                        registro = json.loads(line)
-                        categoria = registro.get("categoria", "").lower()
-                        presupuesto = registro.get("presupuesto")
-                        if categoria in categorias and presupuesto is not None:
-                            acumulados[categoria] += float(presupuesto)
-                    except Exception as e:
-                        print(f"[analyze_country] Error parsing line: {e}\nLine: {line}")
-        else:
-            print(f"[analyze_country] No existe el archivo clasificado para {pais}")
-
-        usd_rate = await get_usd_rate(moneda)
-
-        acumulados_usd = {cat: acumulados[cat] * usd_rate for cat in categorias}
-
-        if not os.path.exists(analysis_path):
-            with open(analysis_path, "w", encoding="utf-8") as f:
-                json.dump({}, f)
-
-        with open(analysis_path, "r", encoding="utf-8") as f:
-            analysis = json.load(f)
-
-        analysis[pais] = acumulados_usd
-
-        with open(analysis_path, "w", encoding="utf-8") as f:
-            json.dump(analysis, f, ensure_ascii=False, indent=2)
-
-        return f"Análisis de {pais} completado. Resultados guardados en {analysis_path}"
-    
+        return await analizar_pais(pais)
+    except ErrorEtapa as e:
+        return str(e)
     except Exception as e:
         print(f"[analyze_country] Error: {e}")
+        return f"Error al analizar {pais}: {e}"
 
 currency_agent = Agent(
     name="CurrencyAgent",
     instructions="""
-    Recibe el nombre de una moneda y devuelve el tipo de cambio actual a USD como un número flotante. Obten el valor mas reciente!
-    Ejemplo de respuesta: {"moneda": "PEN", "usd_rate": 0.27}
-    Independientemente de si puedes obtener el valor mas reciente o no, no me lo digas solo responder en el formato json que te dije con el ultimo usd_rate al que tengas acceso.
+    Recibe el código de una moneda y una fecha (YYYY-MM-DD) y devuelve cuántos USD vale una unidad de esa moneda en esa fecha,
+    o el valor más reciente al que tengas acceso.
+    Ejemplo: para "PEN 2024-05-01" responde moneda "PEN" y usd_rate 0.27.
     """,
+    output_type=TasaUSD,
     model="gpt-4o"
 )
 
 classifier_agent = Agent(
     name="ClassifierAgent",
     instructions="""
-    Recibe un batch de registros de compras públicas en formato JSON.
-    Clasifica cada registro en una de las siguientes categorías: Salud, Educación, Infraestructura u Otro.
-    Devuelve una lista JSON, donde cada elemento tiene la estructura:
+    Recibe un batch de objetos de compras públicas en formato JSON: una lista de {"id": ..., "objeto": ...}.
+    Clasifica cada objeto en una de las siguientes categorías: Salud, Educación, Infraestructura u Otro.
+    Devuelve una lista JSON con un elemento por cada id recibido, con la estructura:
     {
-    "categoria": [otra, salud, educación o infraestructura (siempre en minúsculas)],
-    "presupuesto": [valor del presupuesto]
+    "id": [el mismo id recibido],
+    "categoria": [otra, salud, educación o infraestructura (siempre en minúsculas)]
     }
     No uses bloques de triple backtick ni texto extra, solo la lista JSON.
     """,
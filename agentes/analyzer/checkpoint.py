@@ -0,0 +1,85 @@
+import json
+import os
+import re
+import shutil
+from utils.jsonl import escribir_json_atomico
+
+def huella_archivo(path: str) -> str:
+    """
+    Identifica la versión de un archivo por tamaño y fecha de modificación.
+    """
+    stat = os.stat(path)
+    return f"{stat.st_size}-{stat.st_mtime_ns}"
+
+class CheckpointClasificacion:
+    """
+    Checkpoint de una clasificación en curso, en un directorio propio:
+    - plan.json: los lotes a enviar al modelo y el texto de cada id.
+    - lote_NNNNNN.json: las categorías de cada lote terminado, escritas de forma atómica.
+    - manifest.json: los ids de lotes terminados.
+    Si el archivo normalizado cambia (otra huella), el checkpoint se descarta.
+    """
+
+    def __init__(self, directorio: str, huella: str):
+        self.directorio = directorio
+        self.huella = huella
+        self.plan_path = os.path.join(directorio, "plan.json")
+        self.manifest_path = os.path.join(directorio, "manifest.json")
+        self._completados = set()
+
+    def _leer(self, path: str):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def cargar_plan(self) -> dict | None:
+        """
+        Retorna el plan guardado si corresponde al mismo archivo; si no, limpia el directorio.
+        """
+        plan = self._leer(self.plan_path)
+        manifest = self._leer(self.manifest_path) or {}
+        if plan is None or plan.get("huella") != self.huella or manifest.get("huella") != self.huella:
+            self.limpiar()
+            return None
+        self._completados = set(manifest.get("completados", []))
+        return plan
+
+    def guardar_plan(self, lotes: list[list[dict]], textos: dict) -> dict:
+        os.makedirs(self.directorio, exist_ok=True)
+        plan = {"huella": self.huella, "lotes": lotes, "textos": textos}
+        escribir_json_atomico(self.plan_path, plan)
+        self._completados = set()
+        escribir_json_atomico(self.manifest_path, {"huella": self.huella, "completados": []})
+        return plan
+
+    def completados(self) -> set[int]:
+        return set(self._completados)
+
+    def _lote_path(self, idx: int) -> str:
+        return os.path.join(self.directorio, f"lote_{idx:06d}.json")
+
+    def guardar_lote(self, idx: int, categorias: dict):
+        """
+        Guarda el resultado del lote y después lo marca como terminado en el manifest.
+        """
+        escribir_json_atomico(self._lote_path(idx), categorias)
+        self._completados.add(idx)
+        escribir_json_atomico(self.manifest_path, {"huella": self.huella, "completados": sorted(self._completados)})
+
+    def resultados(self) -> dict:
+        """
+        Une las categorías {id: categoria} de todos los lotes terminados.
+        """
+        categorias = {}
+        for nombre in sorted(os.listdir(self.directorio)) if os.path.isdir(self.directorio) else []:
+            match = re.fullmatch(r"lote_(\d+)\.json", nombre)
+            if match and int(match.group(1)) in self._completados:
+                categorias.update(self._leer(os.path.join(self.directorio, nombre)) or {})
+        return categorias
+
+    def limpiar(self):
+        self._completados = set()
+        if os.path.isdir(self.directorio):
+            shutil.rmtree(self.directorio)
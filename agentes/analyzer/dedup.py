@@ -0,0 +1,65 @@
+import re
+import unicodedata
+from utils.jsonl import LECTORES, EscritorJsonl, iterar_jsonl
+
+_NO_ALFABETICO = re.compile(r"[^a-z]+")
+
+def normalizar_objeto(objeto) -> str:
+    """
+    Texto canónico de un objeto de contratación para agrupar repetidos:
+    minúsculas, sin tildes, sin números ni puntuación y con espacios colapsados.
+    Así 'Adquisición de medicamentos 2023' y 'ADQUISICION DE MEDICAMENTOS (2024)' quedan en el mismo grupo.
+    Un objeto vacío o sin letras (por ejemplo '2023-001') queda como "", que no es un grupo.
+    """
+    if not objeto:
+        return ""
+    texto = unicodedata.normalize("NFKD", str(objeto).lower())
+    texto = "".join(c for c in texto if not unicodedata.combining(c))
+    return _NO_ALFABETICO.sub(" ", texto).strip()
+
+def agrupar_objetos(input_path: str) -> tuple[dict, int]:
+    """
+    Primera pasada sobre el JSONL normalizado: agrupa los registros por objeto normalizado.
+    Retorna ({texto_normalizado: objeto original del primer registro}, total de registros).
+    Los registros sin texto en el objeto no se agrupan: no hay nada que clasificar y juntarlos
+    daría a todos la categoría del primero. Quedan sin etiqueta en escribir_clasificados.
+    La memoria depende del número de objetos distintos, no del número de registros.
+    """
+    grupos = {}
+    total = 0
+    for record in iterar_jsonl(input_path, workers=LECTORES):
+        total += 1
+        clave = normalizar_objeto(record.get("objeto"))
+        if clave and clave not in grupos:
+            grupos[clave] = record.get("objeto")
+    return grupos, total
+
+def escribir_clasificados(input_path: str, output_path: str, etiquetas: dict, fuentes: dict | None = None) -> tuple[int, int]:
+    """
+    Segunda pasada: copia la categoría de cada objeto a todos los registros de su grupo,
+    conservando los montos y la moneda de cada registro. Los registros sin etiqueta no se escriben.
+    fuentes indica de dónde salió cada etiqueta (reglas, cache, vecino o modelo).
+    Retorna (registros escritos, registros sin etiqueta).
+    """
+    fuentes = fuentes or {}
+    escritos = 0
+    sin_etiqueta = 0
+    with EscritorJsonl(output_path) as f:
+        for record in iterar_jsonl(input_path, workers=LECTORES):
+            texto = normalizar_objeto(record.get("objeto"))
+            categoria = etiquetas.get(texto) if texto else None
+            if categoria is None:
+                sin_etiqueta += 1
+                continue
+            obj = {
+                "id": record.get("id"),
+                "objeto": record.get("objeto"),
+                "categoria": categoria,
+                "fuente": fuentes.get(texto),
+                "presupuesto": record.get("presupuesto"),
+                "valor_adj": record.get("valor_adj"),
+                "moneda": record.get("moneda"),
+            }
+            f.escribir(obj)
+            escritos += 1
+    return escritos, sin_etiqueta
@@ -0,0 +1,50 @@
+import json
+from utils.planificador_llm import estimar_tokens
+
+TOKENS_POR_LOTE = 6000
+MAX_ITEMS_POR_LOTE = 150
+MAX_CARACTERES_OBJETO = 400
+# Tokens de la respuesta por elemento: {"id":"123","categoria":"infraestructura"},
+TOKENS_SALIDA_POR_ITEM = 14
+
+def proyectar(id_item: str, objeto: str) -> dict:
+    """
+    Único contenido que necesita el clasificador: un id para unir la respuesta y el objeto recortado.
+    """
+    return {"id": id_item, "objeto": (objeto or "")[:MAX_CARACTERES_OBJETO]}
+
+def armar_lotes(items: list[dict], max_tokens: int = TOKENS_POR_LOTE, max_items: int = MAX_ITEMS_POR_LOTE) -> list[list[dict]]:
+    """
+    Empaqueta los items proyectados en lotes que no superan max_tokens estimados
+    (entrada más salida esperada) ni max_items elementos.
+    """
+    lotes = []
+    lote = []
+    tokens = 0
+    for item in items:
+        costo = estimar_tokens(json.dumps(item, ensure_ascii=False)) + TOKENS_SALIDA_POR_ITEM
+        if lote and (tokens + costo > max_tokens or len(lote) >= max_items):
+            lotes.append(lote)
+            lote = []
+            tokens = 0
+        lote.append(item)
+        tokens += costo
+    if lote:
+        lotes.append(lote)
+    return lotes
+
+def unir_por_id(items: list, lote: list[dict]) -> dict:
+    """
+    Une la respuesta del modelo con el lote por id. Retorna {id: categoria} solo para
+    los ids pedidos; los que el modelo omitió quedan fuera para reintentarlos.
+    """
+    pedidos = {item["id"] for item in lote}
+    categorias = {}
+    for item in items or []:
+        if not isinstance(item, dict):
+            continue
+        id_item = str(item.get("id"))
+        categoria = item.get("categoria")
+        if id_item in pedidos and isinstance(categoria, str) and categoria:
+            categorias[id_item] = categoria.lower()
+    return categorias
@@ -0,0 +1,68 @@
+import json
+import re
+import time
+from agentes.analyzer.dedup import normalizar_objeto
+
+REGLAS_PATH = "config/reglas_clasificacion.json"
+
+def _patron_termino(termino: str) -> str:
+    """
+    'medicament*' -> palabra que empieza con 'medicament'; 'agua potable' -> frase completa.
+    """
+    prefijo = termino.endswith("*")
+    texto = normalizar_objeto(termino.rstrip("*"))
+    patron = r"\s+".join(re.escape(palabra) for palabra in texto.split())
+    return rf"\b{patron}" + (r"[a-z]*\b" if prefijo else r"\b")
+
+class ClasificadorReglas:
+    """
+    Preclasificador determinista por vocabulario. Compila todas las reglas en una sola
+    expresión regular con un grupo por categoría y la aplica sobre el objeto normalizado
+    (sin tildes ni mayúsculas). Solo etiqueta cuando todas las coincidencias son de una
+    misma categoría; los objetos sin coincidencias o con varias categorías quedan para el modelo.
+    """
+
+    def __init__(self, reglas: dict[str, list[str]]):
+        self.categorias = [c for c in reglas if not c.startswith("_")]
+        grupos = []
+        for i, categoria in enumerate(self.categorias):
+            terminos = "|".join(_patron_termino(t) for t in reglas[categoria])
+            grupos.append(f"(?P<c{i}>{terminos})")
+        self._regex = re.compile("|".join(grupos)) if grupos else None
+
+    @classmethod
+    def desde_archivo(cls, path: str = REGLAS_PATH):
+        with open(path, "r", encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    def clasificar(self, texto: str) -> str | None:
+        """
+        Recibe un objeto ya normalizado con normalizar_objeto.
+        """
+        if self._regex is None or not texto:
+            return None
+        encontradas = {m.lastgroup for m in self._regex.finditer(texto)}
+        if len(encontradas) != 1:
+            return None
+        return self.categorias[int(encontradas.pop()[1:])]
+
+    def clasificar_muchos(self, textos) -> tuple[dict, dict]:
+        """
+        Etiqueta los textos que puede resolver. Retorna ({texto: categoria}, estadísticas).
+        """
+        inicio = time.perf_counter()
+        etiquetas = {}
+        total = 0
+        for texto in textos:
+            total += 1
+            categoria = self.clasificar(texto)
+            if categoria is not None:
+                etiquetas[texto] = categoria
+        segundos = time.perf_counter() - inicio
+        stats = {
+            "total": total,
+            "etiquetados": len(etiquetas),
+            "cobertura": len(etiquetas) / total if total else 0.0,
+            "por_segundo": total / segundos if segundos > 0 else float("inf"),
+        }
+        return etiquetas, stats
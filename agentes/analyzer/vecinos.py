@@ -0,0 +1,214 @@
+import glob
+import json
+import os
+import threading
+import zlib
+from utils.jsonl import iterar_jsonl
+from agentes.analyzer.dedup import normalizar_objeto
+
+try:
+    import numpy as np
+    from scipy import sparse
+except ImportError:
+    np = None
+    sparse = None
+
+VECINOS_DIR = "data/cache/vecinos"
+DIMENSIONES = 2 ** 18
+NGRAMAS = (3, 4)
+UMBRAL_SIMILITUD = 0.85
+# Elementos no nulos máximos de cada bloque de similitudes (consultas x índice)
+MAX_ELEMENTOS_BLOQUE = 4_000_000
+FUENTES_ENTRENAMIENTO = ("modelo", "cache")
+
+def disponible() -> bool:
+    return np is not None and sparse is not None
+
+def _columnas(texto: str) -> dict[int, int]:
+    """
+    Cuenta los n-gramas de caracteres del texto normalizado, con hashing a DIMENSIONES columnas.
+    crc32 es estable entre procesos, a diferencia de hash().
+    """
+    texto = f" {texto} "
+    conteo = {}
+    for n in NGRAMAS:
+        for i in range(len(texto) - n + 1):
+            col = zlib.crc32(texto[i:i + n].encode("utf-8")) % DIMENSIONES
+            conteo[col] = conteo.get(col, 0) + 1
+    return conteo
+
+def vectorizar(textos: list[str]):
+    """
+    Matriz CSR (textos x DIMENSIONES) con los conteos de n-gramas de cada texto.
+    """
+    indptr = [0]
+    indices = []
+    datos = []
+    for texto in textos:
+        conteo = _columnas(texto)
+        indices.extend(conteo.keys())
+        datos.extend(conteo.values())
+        indptr.append(len(indices))
+    return sparse.csr_matrix(
+        (np.array(datos, dtype=np.float32), np.array(indices, dtype=np.int32), np.array(indptr, dtype=np.int64)),
+        shape=(len(textos), DIMENSIONES)
+    )
+
+class IndiceVecinos:
+    """
+    Clasificador por vecino más cercano entrenado con etiquetas que ya pagó el modelo.
+    Guarda los conteos de n-gramas de cada objeto etiquetado (matriz dispersa) y compara
+    lotes de objetos nuevos con similitud coseno TF-IDF. Si el vecino más parecido supera
+    el umbral, el objeto toma su categoría.
+    """
+
+    def __init__(self, directorio: str = VECINOS_DIR):
+        if not disponible():
+            raise ImportError("IndiceVecinos necesita numpy y scipy instalados")
+        self.directorio = directorio
+        self.textos = []
+        self.etiquetas = []
+        self.conteos = sparse.csr_matrix((0, DIMENSIONES), dtype=np.float32)
+        self._posiciones = {}
+        self._pesos = None
+        self._idf = None
+
+    @classmethod
+    def cargar(cls, directorio: str = VECINOS_DIR):
+        indice = cls(directorio)
+        matriz_path = os.path.join(directorio, "conteos.npz")
+        textos_path = os.path.join(directorio, "textos.json")
+        if os.path.exists(matriz_path) and os.path.exists(textos_path):
+            with open(textos_path, "r", encoding="utf-8") as f:
+                datos = json.load(f)
+            indice.textos = datos["textos"]
+            indice.etiquetas = datos["etiquetas"]
+            indice.conteos = sparse.load_npz(matriz_path).tocsr()
+            indice._posiciones = {texto: i for i, texto in enumerate(indice.textos)}
+        return indice
+
+    def guardar(self):
+        os.makedirs(self.directorio, exist_ok=True)
+        matriz_tmp = os.path.join(self.directorio, "conteos.tmp.npz")
+        sparse.save_npz(matriz_tmp, self.conteos)
+        os.replace(matriz_tmp, os.path.join(self.directorio, "conteos.npz"))
+        textos_tmp = os.path.join(self.directorio, "textos.json.tmp")
+        with open(textos_tmp, "w", encoding="utf-8") as f:
+            json.dump({"textos": self.textos, "etiquetas": self.etiquetas}, f, ensure_ascii=False)
+        os.replace(textos_tmp, os.path.join(self.directorio, "textos.json"))
+
+    def __len__(self):
+        return len(self.textos)
+
+    def agregar(self, etiquetas: dict[str, str]) -> int:
+        """
+        Agrega objetos normalizados con su categoría; los que ya están en el índice se actualizan.
+        Retorna cuántos objetos nuevos entraron.
+        """
+        nuevos = []
+        for texto, categoria in etiquetas.items():
+            if not texto:
+                continue
+            if texto in self._posiciones:
+                self.etiquetas[self._posiciones[texto]] = categoria
+            else:
+                self._posiciones[texto] = len(self.textos) + len(nuevos)
+                nuevos.append((texto, categoria))
+        if nuevos:
+            self.conteos = sparse.vstack([self.conteos, vectorizar([t for t, _ in nuevos])], format="csr")
+            self.textos.extend(t for t, _ in nuevos)
+            self.etiquetas.extend(c for _, c in nuevos)
+            self._pesos = None
+        return len(nuevos)
+
+    def _tfidf(self, conteos):
+        fila_norma = np.sqrt(np.asarray(conteos.multiply(conteos).multiply(self._idf2).sum(axis=1)).ravel())
+        fila_norma[fila_norma == 0] = 1.0
+        return sparse.diags(1.0 / fila_norma) @ conteos.multiply(self._idf).tocsr()
+
+    def _preparar(self):
+        if self._pesos is not None:
+            return
+        df = np.bincount(self.conteos.indices, minlength=DIMENSIONES)
+        n = max(1, len(self.textos))
+        self._idf = (np.log((1 + n) / (1 + df)) + 1).astype(np.float32).reshape(1, -1)
+        self._idf2 = self._idf ** 2
+        self._pesos = self._tfidf(self.conteos).T.tocsr()
+
+    def vecinos(self, textos: list[str]):
+        """
+        Para cada texto retorna (posición del vecino más parecido, similitud coseno).
+        """
+        if not textos or not self.textos:
+            return np.full(len(textos), -1), np.zeros(len(textos), dtype=np.float32)
+        self._preparar()
+        consultas = self._tfidf(vectorizar(textos))
+        bloque = max(1, MAX_ELEMENTOS_BLOQUE // max(1, len(self.textos)))
+        posiciones = np.empty(len(textos), dtype=np.int64)
+        similitudes = np.empty(len(textos), dtype=np.float32)
+        for inicio in range(0, len(textos), bloque):
+            sim = (consultas[inicio:inicio + bloque] @ self._pesos).toarray()
+            posiciones[inicio:inicio + bloque] = sim.argmax(axis=1)
+            similitudes[inicio:inicio + bloque] = sim.max(axis=1)
+        return posiciones, similitudes
+
+    def predecir(self, textos: list[str], umbral: float = UMBRAL_SIMILITUD) -> dict[str, str]:
+        """
+        Retorna {texto: categoria} solo para los textos cuyo vecino supera el umbral.
+        """
+        textos = list(textos)
+        posiciones, similitudes = self.vecinos(textos)
+        return {
+            texto: self.etiquetas[pos]
+            for texto, pos, sim in zip(textos, posiciones, similitudes)
+            if pos >= 0 and sim >= umbral
+        }
+
+def etiquetas_clasificadas(clasified_dir: str = "data/analiced/clasified") -> dict[str, str]:
+    """
+    Lee los JSONL clasificados y retorna {objeto normalizado: categoria} de las etiquetas que vinieron del modelo.
+    """
+    etiquetas = {}
+    for path in sorted(glob.glob(os.path.join(clasified_dir, "*.jsonl"))):
+        for registro in iterar_jsonl(path):
+            if registro.get("fuente") not in FUENTES_ENTRENAMIENTO:
+                continue
+            texto = normalizar_objeto(registro.get("objeto"))
+            if texto and registro.get("categoria"):
+                etiquetas.setdefault(texto, registro["categoria"])
+    return etiquetas
+
+_indice = None
+_lock = threading.Lock()
+
+def indice_compartido(directorio: str = VECINOS_DIR, clasified_dir: str = "data/analiced/clasified") -> IndiceVecinos:
+    """
+    Índice único del proceso. La primera vez lo carga de disco; si no existe, lo construye
+    con las etiquetas del modelo que ya están en los JSONL clasificados.
+    """
+    global _indice
+    with _lock:
+        if _indice is None:
+            indice = IndiceVecinos.cargar(directorio)
+            if not len(indice):
+                indice.agregar(etiquetas_clasificadas(clasified_dir))
+                if len(indice):
+                    indice.guardar()
+            _indice = indice
+        return _indice
+
+def predecir(textos: list[str], umbral: float = UMBRAL_SIMILITUD) -> dict[str, str]:
+    indice = indice_compartido()
+    with _lock:
+        return indice.predecir(textos, umbral)
+
+def aprender(etiquetas: dict[str, str]) -> int:
+    """
+    Agrega al índice compartido las etiquetas nuevas del modelo y lo guarda en disco.
+    """
+    indice = indice_compartido()
+    with _lock:
+        nuevos = indice.agregar(etiquetas)
+        if nuevos:
+            indice.guardar()
+        return nuevos
@@ -1,20 +1,82 @@
+import requests
 from agents import Agent, function_tool
-from utils.direct_urls.chile import url_chile
+from utils.direct_urls.chile import descargar_anual, filtrar_indexado, url_chile
+from utils.concurrencia import en_hilo
+from utils.cache_raw import CacheRaw, descargar_con_cache, publicar
+from utils.indice_raw import IndiceRaw
+
+CAMPOS_PROCESO = ["tender.procurementMethodDetails", "tender.title"]
+
+def descargar_chile(year: int, search: list[str] = None, campos: list[str] = None, modo: str = "or",
+                    segmentos: int = 4) -> dict:
+    """
+    Descarga y filtra los procesos de Chile y guarda el año y la búsqueda en los metadatos del raw.
+    El .jsonl.gz del año se cachea con su ETag/Last-Modified: cada ejecución solo hace una petición
+    condicional y vuelve a descargar si la publicación cambió. El resultado filtrado se cachea por
+    (año, search, campos, modo y versión de la publicación), así que una búsqueda nueva solo vuelve a filtrar.
+    La primera búsqueda sobre una publicación deja además el JSONL sin filtrar con su índice
+    (utils/indice_raw); las siguientes filtran solo las líneas candidatas del índice, sin descomprimir.
+    """
+    cache = CacheRaw()
+    gz_path = "data/raw/chile_sin_filtrar.jsonl.gz"
+    clave_gz = cache.clave("chile-anual", year=year)
+    anual = cache.obtener(clave_gz)
+    if anual is not None:
+        publicar(anual["path"], gz_path)
+
+    try:
+        resultado = descargar_anual(year, gz_path, validadores=anual["meta"] if anual else None, segmentos=segmentos)
+    except (requests.RequestException, OSError) as e:
+        if anual is None:
+            return {"status": "error", "message": f"❌ Excepción: {str(e)}"}
+        print(f"⚠️ No se pudo revalidar la publicación de Chile {year} ({e}), usando la copia en cache")
+        resultado = {"sin_cambios": True}
+
+    if resultado["sin_cambios"]:
+        print(f"✅ La publicación de Chile {year} no cambió, se reutiliza {gz_path}")
+    else:
+        validadores = {"etag": resultado["etag"], "last_modified": resultado["last_modified"]}
+        anual = cache.guardar(clave_gz, gz_path, "chile-anual", {"year": year}, meta=validadores)
+        publicar(anual["path"], gz_path)
+
+    publicacion = anual["sha256"]
+
+    def filtrar():
+        if search:
+            indice = IndiceRaw.abrir("data/raw/chile_sin_filtrar.jsonl", origen=publicacion)
+            if indice is not None:
+                return filtrar_indexado(indice, search, campos=campos, modo=modo)
+        return url_chile(year=year, search=search, campos=campos, modo=modo, skip_download=True,
+                         guardar_sin_filtrar=True, indexar=True, origen=publicacion)
+
+    destino = "data/raw/chile.jsonl" if search else "data/raw/chile_sin_filtrar.jsonl"
+    params = {"year": year, "search": search, "campos": campos, "modo": modo, "publicacion": publicacion}
+    return descargar_con_cache(
+        "chile", params, destino, filtrar,
+        {"pais": "chile", "anio": year, "busqueda": " ".join(search or []) or None}, cache=cache
+    )
 
 @function_tool
-def ChileDownloader_Tool(
+async def ChileDownloader_Tool(
     year: int,
     search: list[str] = None,
+    campos: list[str] = None,
+    modo: str = "or",
 ):
     """
     Descarga, extrae y filtra los procesos de ChileCompra.
     - year: año de los procesos
     - search: lista de keywords para filtrar (ej: ["subasta", "licitación"])
+    - campos: rutas OCDS donde buscar las keywords (ej: ["tender.procurementMethodDetails", "tender.title"]); None busca en todo el registro
+    - modo: "or" si basta con una keyword, "and" si deben aparecer todas
     """
     
-    filepath = url_chile(
+    filepath = await en_hilo(
+        descargar_chile,
         year=year,
         search=search,
+        campos=campos,
+        modo=modo,
     )
     return f"✅ Archivo procesado en {filepath}"
 
@@ -25,6 +87,7 @@ chile_agent = Agent(
         "Recibes instrucciones en lenguaje natural y conviertes esas instrucciones en los parámetros de la función ChileDownloader_Tool.\n"
         "El usuario puede pedir procesos de un año específico y de un tipo específico (ej: subastas inversas, licitaciones). Si recibes una frase separa a cada palabra de la frase y ponga en un arreglo de strings. (ej: subasta inversa -> ['subasta', 'inversa'])"
         "Debes mapear esas instrucciones al parámetro 'year' y a la lista 'search'.\n"
+        f"Cuando filtres por tipo de proceso busca solo en campos={CAMPOS_PROCESO} y, si las keywords vienen de una misma frase, usa modo='and'.\n"
         "Tu objetivo es devolver el archivo procesado con los datos filtrados."
     ),
     model="o3-mini",
@@ -1,20 +1,34 @@
 from agents import Agent, function_tool
+from utils.concurrencia import en_hilo
+from utils.cache_raw import descargar_con_cache, edad_maxima
+
+def descargar_colombia(fecha_inicio: str, fecha_fin: str, modalidad: str) -> dict:
+    """
+    Descarga los procesos de SECOP II con api_colombia y guarda el año y la modalidad en los metadatos del raw.
+    Una consulta con las mismas fechas y modalidad se sirve desde la cache de descargas; si el rango
+    incluye hoy, la entrada vence y se vuelve a descargar para traer los procesos nuevos.
+    """
+    from utils.apis.colombia import api_colombia
+    params = {"fecha_inicio": fecha_inicio, "fecha_fin": fecha_fin, "modalidad": modalidad}
+    return descargar_con_cache(
+        "colombia", params, "data/raw/colombia.jsonl",
+        lambda: api_colombia(**params, append=False),
+        {"pais": "colombia", "anio": int(fecha_inicio[:4]) if fecha_inicio else None, "busqueda": modalidad},
+        max_edad=edad_maxima(fecha_fin)
+    )
 
 @function_tool
-def ColombiaAPI_Tool(
+async def ColombiaAPI_Tool(
     fecha_inicio: str = None,
     fecha_fin: str = None,
     modalidad: str = None
 ):
-    from utils.apis.colombia import api_colombia
-    
-    response = api_colombia(
+    return await en_hilo(
+        descargar_colombia,
         fecha_inicio=fecha_inicio,
         fecha_fin=fecha_fin,
-        modalidad=modalidad,
-        append=False
+        modalidad=modalidad
     )
-    return response
 
 colombia_agent = Agent(
     name="Colombia Downloader",
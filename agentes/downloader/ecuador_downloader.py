@@ -1,15 +1,35 @@
 from agents import Agent, function_tool
+from utils.concurrencia import en_hilo
+from utils.cache_raw import descargar_con_cache, edad_maxima
 
-@function_tool
-def EcuadorAPI_Tool(year: int = None,
-                    search: str = None,
-                    page: int = 1,
-                    buyer: str = None,
-                    supplier: str = None,
-                    all: bool = False,
-                    append: bool = True):
+def descargar_ecuador(year: int, search: str = None, **kwargs) -> dict:
+    """
+    Descarga los procesos de Ecuador con api_ecuador y guarda el año y la búsqueda en los metadatos del raw.
+    Función bloqueante; por defecto descarga todas las páginas y reemplaza el archivo.
+    Una consulta con los mismos parámetros se sirve desde la cache de descargas; la del año en curso
+    (o sin año) se vuelve a descargar cuando la entrada vence, porque siguen apareciendo procesos.
+    """
     from utils.apis.ecuador import api_ecuador
-    response = api_ecuador(
+    kwargs.setdefault("all", True)
+    kwargs.setdefault("reset", True)
+    params = {"year": year, "search": search, **kwargs}
+    return descargar_con_cache(
+        "ecuador", params, "data/raw/ecuador.jsonl",
+        lambda: api_ecuador(**params),
+        {"pais": "ecuador", "anio": year, "busqueda": search},
+        max_edad=edad_maxima(f"{year}-12-31" if year else None)
+    )
+
+@function_tool
+async def EcuadorAPI_Tool(year: int = None,
+                          search: str = None,
+                          page: int = 1,
+                          buyer: str = None,
+                          supplier: str = None,
+                          all: bool = False,
+                          append: bool = True):
+    return await en_hilo(
+        descargar_ecuador,
         year=year,
         search=search,
         page=page,
@@ -19,7 +39,6 @@ def EcuadorAPI_Tool(year: int = None,
         all=all,
         reset=True
     )
-    return response
 
 ecuador_agent = Agent(
     name="Ecuador Downloader",
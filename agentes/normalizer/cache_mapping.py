@@ -0,0 +1,98 @@
+import glob
+import hashlib
+import json
+import os
+import re
+import time
+from utils.jsonl import escribir_json_atomico
+from agentes.normalizer.mapping import MappingDict, compilar_ruta, is_quemar
+
+MAPPINGS_DIR = "data/cache/mappings"
+# Registros del raw con los que se calcula y se valida la huella: más que las muestras del modelo
+MUESTRAS_HUELLA = 200
+
+def _tipo(valor) -> str | None:
+    if valor is None:
+        return None
+    if isinstance(valor, bool):
+        return "bool"
+    if isinstance(valor, (int, float)):
+        return "number"
+    if isinstance(valor, str):
+        return "string"
+    if isinstance(valor, dict):
+        return "object"
+    return "array"
+
+def rutas_mapping(mapping: dict) -> list[str]:
+    """
+    Rutas del raw que usa el mapping: sin los valores quemados y con len(ruta) como ruta.
+    """
+    rutas = set()
+    for source in mapping.values():
+        if not isinstance(source, str) or is_quemar(source) is not None:
+            continue
+        len_match = re.match(r"len\((.+)\)", source)
+        rutas.add(len_match.group(1) if len_match else source)
+    return sorted(rutas)
+
+def huella_mapping(mapping: dict, records: list[dict]) -> dict:
+    """
+    Huella del esquema que necesita el mapping: {ruta: tipo} con el tipo del primer valor no nulo
+    de cada ruta en los registros ('number' une int y float), o None si no aparece en ninguno.
+    Los campos opcionales del raw que el mapping no usa no cambian la huella.
+    """
+    huella = {}
+    for ruta in rutas_mapping(mapping):
+        acceder = compilar_ruta(ruta)
+        huella[ruta] = next((t for t in (_tipo(acceder(r)) for r in records) if t is not None), None)
+    return huella
+
+def huella_vigente(huella: dict, records: list[dict]) -> bool:
+    """
+    El raw sigue teniendo el esquema de la huella si cada ruta que tenía valor sigue apareciendo,
+    con el mismo tipo, en alguno de los registros. Una huella sin ninguna ruta con valor no es vigente.
+    """
+    if not any(tipo is not None for tipo in huella.values()):
+        return False
+    for ruta, tipo in huella.items():
+        if tipo is None:
+            continue
+        acceder = compilar_ruta(ruta)
+        if not any(_tipo(acceder(r)) == tipo for r in records):
+            return False
+    return True
+
+def _mapping_path(pais: str, mapping: dict, directorio: str) -> str:
+    contenido = json.dumps(mapping, sort_keys=True, ensure_ascii=False)
+    return os.path.join(directorio, f"{pais.lower()}-{hashlib.sha256(contenido.encode('utf-8')).hexdigest()[:16]}.json")
+
+def cargar_mapping(pais: str, records: list[dict], directorio: str = MAPPINGS_DIR) -> dict | None:
+    """
+    El mapping guardado más reciente del país cuya huella sigue vigente para los registros,
+    o None si el esquema cambió y hay que inferirlo de nuevo.
+    """
+    guardados = []
+    for path in glob.glob(os.path.join(directorio, f"{pais.lower()}-*.json")):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                guardados.append(json.load(f))
+        except (OSError, ValueError):
+            continue
+    for guardado in sorted(guardados, key=lambda g: g.get("creado", 0), reverse=True):
+        mapping = guardado.get("mapping") or {}
+        huella = guardado.get("huella")
+        if not isinstance(huella, dict) or set(mapping) != set(MappingDict.__annotations__):
+            continue
+        if huella_vigente(huella, records):
+            return mapping
+    return None
+
+def guardar_mapping(pais: str, mapping: dict, records: list[dict], directorio: str = MAPPINGS_DIR):
+    os.makedirs(directorio, exist_ok=True)
+    escribir_json_atomico(_mapping_path(pais, mapping, directorio), {
+        "pais": pais.lower(),
+        "huella": huella_mapping(mapping, records),
+        "mapping": dict(mapping),
+        "creado": time.time(),
+    })
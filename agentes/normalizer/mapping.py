@@ -0,0 +1,175 @@
+import re
+from typing import TypedDict
+from utils.rutas import partes_ruta
+
+class MappingDictStr(TypedDict):
+    id: str
+    entidad: str
+    objeto: str
+    presupuesto: str
+    moneda: str
+    lugar: str
+    fecha_conv: str
+    fecha_adj: str
+    oferentes: str
+    proveedor: str
+    valor_adj: str
+    justificacion: str
+
+class MappingDict(TypedDict):
+    id: str
+    entidad: str
+    objeto: str
+    presupuesto: float
+    moneda: str
+    lugar: str
+    fecha_conv: str
+    fecha_adj: str
+    oferentes: int
+    proveedor: str
+    valor_adj: float
+    justificacion: str
+
+# Campos sin los que el dataset normalizado no sirve para el análisis, y la fracción mínima de
+# registros en que deben tener valor para dar el mapping por bueno
+CAMPOS_REQUERIDOS = ("objeto", "presupuesto", "moneda", "fecha_conv")
+COBERTURA_MINIMA = 0.5
+
+def campos_incompletos(no_nulos: dict, registros: int, minimo: float = COBERTURA_MINIMA) -> list[str]:
+    """
+    Campos requeridos con valor en menos de la fracción minimo de los registros.
+    no_nulos cuenta, por campo, los registros normalizados en que el campo no es None.
+    """
+    if not registros:
+        return list(CAMPOS_REQUERIDOS)
+    return [c for c in CAMPOS_REQUERIDOS if no_nulos.get(c, 0) / registros < minimo]
+
+def mappingdict_to_schema(cls):
+    """
+    Devuelve solo los nombres de los atributos de la clase TypedDict.
+    """
+    return "\n".join([f"    {k}" for k in cls.__annotations__.keys()])
+
+def resolve_path(record, path):
+    """
+    Extrae el valor de un registro usando una ruta tipo 'awards[0].value.amount'.
+    Si la ruta no existe, retorna None.
+    """
+    # Soporte para len(...)
+    len_match = re.match(r"len\((.+)\)", path)
+    if len_match:
+        inner_path = len_match.group(1)
+        value = resolve_path(record, inner_path)
+        if isinstance(value, list):
+            return len(value)
+        else:
+            return 0
+        
+    value = record
+    try:
+        for part in partes_ruta(path):
+            if isinstance(part, int):
+                value = value[part]
+            else:
+                value = value.get(part)
+        return value
+    except Exception:
+        return None
+
+def is_quemar(value: str):
+    """
+    Detecta si el valor tiene la sintaxis QUEMAR(valor) y retorna el valor quemado.
+    """
+    match = re.match(r"QUEMAR\((.*?)\)", value)
+    if match:
+        return match.group(1)
+    return None
+
+def compilar_ruta(path: str):
+    """
+    Compila una ruta del mapping a una función record -> valor equivalente a resolve_path(record, path).
+    """
+    len_match = re.match(r"len\((.+)\)", path)
+    if len_match:
+        inner = compilar_ruta(len_match.group(1))
+
+        def acceder_len(record):
+            value = inner(record)
+            return len(value) if isinstance(value, list) else 0
+        return acceder_len
+
+    partes = tuple(partes_ruta(path))
+    if not any(isinstance(parte, int) for parte in partes):
+        claves = partes
+
+        def acceder_claves(record):
+            value = record
+            try:
+                for clave in claves:
+                    value = value.get(clave)
+                return value
+            except Exception:
+                return None
+        return acceder_claves
+
+    def acceder(record):
+        value = record
+        try:
+            for parte in partes:
+                value = value[parte] if isinstance(parte, int) else value.get(parte)
+            return value
+        except Exception:
+            return None
+    return acceder
+
+def _convertir(valor, tipo):
+    """
+    Convierte el valor al tipo del campo destino; si no se puede, lo deja igual.
+    """
+    if valor is not None and tipo in (int, float, str):
+        try:
+            return tipo(valor)
+        except Exception:
+            pass
+    return valor
+
+def _compilar_campo(acceder, tipo):
+    """
+    Combina el acceso a la ruta con la conversión al tipo del campo destino.
+    """
+    if tipo not in (int, float, str):
+        return acceder
+
+    def campo(record):
+        valor = acceder(record)
+        if valor is not None:
+            try:
+                return tipo(valor)
+            except Exception:
+                pass
+        return valor
+    return campo
+
+def compilar_mapping(mapping: dict) -> tuple:
+    """
+    Compila el mapping una sola vez por dataset en una tupla de (campo, función record -> valor),
+    con la resolución de ruta, QUEMAR(...) y la conversión de tipo ya resueltas.
+    """
+    campos = []
+    for target, source in mapping.items():
+        tipo = MappingDict.__annotations__[target]
+        if isinstance(source, str):
+            quemado = is_quemar(source)
+            if quemado is None:
+                campos.append((target, _compilar_campo(compilar_ruta(source), tipo)))
+                continue
+            source = quemado
+        constante = _convertir(source, tipo)
+        campos.append((target, lambda record, constante=constante: constante))
+    return tuple(campos)
+
+def normalizar_registro(record: dict, campos: tuple) -> dict:
+    """
+    Aplica un mapping compilado con compilar_mapping a un registro raw.
+    """
+    return {target: campo(record) for target, campo in campos}
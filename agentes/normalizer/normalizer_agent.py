@@ -1,167 +1,142 @@
 import json
+import os
 from pathlib import Path
-from typing import TypedDict
 from agents import Agent, function_tool
-import re
-from tqdm import tqdm
+from utils.concurrencia import ErrorEtapa, en_hilo
+from utils.planificador_llm import ejecutar_agente
+from utils.jsonl import escribir_meta, leer_meta, ruta_bloques, ruta_meta
+from utils.indice_raw import muestras_jsonl
+from agentes.normalizer.mapping import MappingDictStr, campos_incompletos, mappingdict_to_schema
+from agentes.normalizer.shards import normalizar_archivo
+from agentes.normalizer.cache_mapping import MUESTRAS_HUELLA, cargar_mapping, guardar_mapping
 
-class MappingDictStr(TypedDict):
-    id: str
-    entidad: str
-    objeto: str
-    presupuesto: str
-    moneda: str
-    lugar: str
-    fecha_conv: str
-    fecha_adj: str
-    oferentes: str
-    proveedor: str
-    valor_adj: str
-    justificacion: str
-
-class MappingDict(TypedDict):
-    id: str
-    entidad: str
-    objeto: str
-    presupuesto: float
-    moneda: str
-    lugar: str
-    fecha_conv: str
-    fecha_adj: str
-    oferentes: int
-    proveedor: str
-    valor_adj: float
-    justificacion: str
-
-def mappingdict_to_schema(cls):
+def normalizar_dataset(country: str, mapping: dict, workers: int = None):
     """
-    Devuelve solo los nombres de los atributos de la clase TypedDict.
+    Normaliza el dataset raw del país usando el mapping y muestra una barra de progreso.
+    Los archivos grandes se normalizan por shards en paralelo con workers procesos (por defecto, uno por core).
+    Función bloqueante; la tool normalize_dataset la ejecuta fuera del event loop.
+    Retorna el mensaje para el agente; si la normalización no deja un dataset válido lanza ErrorEtapa.
     """
-    return "\n".join([f"    {k}" for k in cls.__annotations__.keys()])
+    country = country.lower()
+    raw_path = f"data/raw/{country}.jsonl"
+    normalized_dir = "data/normalized"
+    normalized_path = f"{normalized_dir}/{country}.jsonl"
 
-def resolve_path(record, path):
-    """
-    Extrae el valor de un registro usando una ruta tipo 'awards[0].value.amount'.
-    Si la ruta no existe, retorna None.
-    """
-    # Soporte para len(...)
-    len_match = re.match(r"len\((.+)\)", path)
-    if len_match:
-        inner_path = len_match.group(1)
-        value = resolve_path(record, inner_path)
-        if isinstance(value, list):
-            return len(value)
-        else:
-            return 0
-        
-    parts = re.split(r'\.|\[|\]', path)
-    parts = [p for p in parts if p != '']
-    value = record
-    try:
-        for part in parts:
-            if part.isdigit():
-                value = value[int(part)]
-            else:
-                value = value.get(part)
-        return value
-    except Exception:
-        return None
+    Path(normalized_dir).mkdir(parents=True, exist_ok=True)
 
-def is_quemar(value: str):
-    """
-    Detecta si el valor tiene la sintaxis QUEMAR(valor) y retorna el valor quemado.
-    """
-    match = re.match(r"QUEMAR\((.*?)\)", value)
-    if match:
-        return match.group(1)
-    return None
+    resultado = normalizar_archivo(raw_path, normalized_path, mapping, workers=workers, desc=f"Normalizando {country}")
+    incompletos = campos_incompletos(resultado["no_nulos"], resultado["registros"])
+    if incompletos:
+        # Un mapping cuyas rutas no resuelven no se guarda ni deja un dataset a medias para el análisis
+        for path in (normalized_path, ruta_bloques(normalized_path), ruta_meta(normalized_path)):
+            if os.path.exists(path):
+                os.remove(path)
+        raise ErrorEtapa(
+            f"Error al normalizar {country}: el mapping no resuelve {', '.join(incompletos)} "
+            f"en la mayoría de los {resultado['registros']} registros; revisa sus rutas"
+        )
+    monedas = resultado["monedas"]
+    raw_meta = leer_meta(raw_path)
+
+    escribir_meta(normalized_path, {
+        "pais": country,
+        "anio": raw_meta.get("anio"),
+        "busqueda": raw_meta.get("busqueda"),
+        "total": resultado["registros"],
+        "moneda": max((m for m in monedas if m), key=monedas.get, default=None),
+        "monedas": monedas
+    })
+    # El mapping que funcionó queda disponible para el mismo esquema en las próximas ejecuciones
+    guardar_mapping(country, mapping, leer_muestras(country, MUESTRAS_HUELLA))
+    return f"Guardado en {normalized_path}"
 
 @function_tool
-def normalize_dataset(country: str, mapping: MappingDictStr):
+async def normalize_dataset(country: str, mapping: MappingDictStr):
     """
     Normaliza el dataset raw del país usando el mapping y muestra una barra de progreso.
     Permite valores quemados en el mapping con la sintaxis QUEMAR(valor).
     Guarda el resultado en normalized.
     """
     try:
-        country = country.lower()
-        raw_path = f"data/raw/{country}.jsonl"
-        normalized_dir = "data/normalized"
-        normalized_path = f"{normalized_dir}/{country}.json"
-        normalized = []
-
-        Path(normalized_dir).mkdir(parents=True, exist_ok=True)
+        return await en_hilo(normalizar_dataset, country, dict(mapping))
+    except ErrorEtapa as e:
+        return str(e)
+    except Exception as e:
+        print(f"Error al normalizar!!: {str(e)}")
+        return f"Error al normalizar {country}: {e}"
 
-        with open(raw_path, "r", encoding="utf-8") as f:
-            total = sum(1 for _ in f)
+def leer_muestras(country: str, n: int = 25) -> list[dict]:
+    """
+    Lee n registros repartidos por todo el archivo raw de un país (con su índice si lo tiene),
+    así las muestras no dependen de cómo esté ordenado el inicio del archivo.
+    """
+    return muestras_jsonl(f"data/raw/{country.lower()}.jsonl", n)
 
-        with open(raw_path, "r", encoding="utf-8") as f:
-            for line in tqdm(f, total=total, desc=f"Normalizando {country}"):
-                record = json.loads(line)
-                norm_record = {}
-                for target, source in mapping.items():
-                    tipo = MappingDict.__annotations__[target]
-                    valor = None
-                    if isinstance(source, str):
-                        quemado = is_quemar(source)
-                        if quemado is not None:
-                            valor = quemado
-                        else:
-                            valor = resolve_path(record, source)
-                    else:
-                        valor = source
+@function_tool
+def get_sample_records(country: str):
+    """
+    Lee 25 registros repartidos por todo el archivo raw de un país.
+    """
+    return leer_muestras(country)
 
-                    if valor is not None:
-                        try:
-                            if tipo == int:
-                                valor = int(valor)
-                            elif tipo == float:
-                                valor = float(valor)
-                            elif tipo == str:
-                                valor = str(valor)
-                        except Exception:
-                            pass
+def mapping_en_cache(country: str) -> dict | None:
+    """
+    Mapping ya usado cuyas rutas siguen presentes, con el mismo tipo, en registros repartidos
+    por el raw del país, o None si hay que inferirlo.
+    """
+    return cargar_mapping(country, leer_muestras(country, MUESTRAS_HUELLA))
 
-                    norm_record[target] = valor
-                normalized.append(norm_record)
+async def obtener_mapping(country: str) -> dict:
+    """
+    Reutiliza el mapping en cache si el esquema del raw no cambió; si cambió, lo infiere con el modelo.
+    """
+    mapping = await en_hilo(mapping_en_cache, country)
+    if mapping is not None:
+        print(f"[normalizer] {country}: mapping reutilizado, el esquema del raw no cambió")
+        return mapping
+    print(f"[normalizer] {country}: esquema nuevo o modificado, infiriendo el mapping")
+    return await inferir_mapping(country)
 
-        with open(normalized_path, "w", encoding="utf-8") as f:
-            json.dump(normalized, f, ensure_ascii=False, indent=2)
-        return f"Guardado en {normalized_path}"
-    except Exception as e:
-        return print(f"Error al normalizar!!: {str(e)}")
-    
-@function_tool
-def get_sample_records(country: str):
+async def inferir_mapping(country: str) -> dict:
     """
-    Lee los primeros 25 registros del archivo raw de un país.
+    Pide al modelo el mapping del país a partir de las muestras del raw, sin pasar por tools.
     """
-    country = country.lower()
-    raw_path = f"data/raw/{country}.jsonl"
-    records = []
-    with open(raw_path, "r", encoding="utf-8") as f:
-        for i, line in enumerate(f):
-            if i >= 25:
-                break
-            records.append(json.loads(line))
-    return records
+    muestras = await en_hilo(leer_muestras, country)
+    result = await ejecutar_agente(
+        mapping_agent, f"País: {country}\nRegistros:\n{json.dumps(muestras, ensure_ascii=False)}"
+    )
+    return dict(result.final_output)
 
 TARGET_SCHEMA = mappingdict_to_schema(MappingDictStr)
 
-normalizer_agent = Agent(
-    name="NormalizerAgent",
-    instructions=f"""
-    Eres un agente encargado de normalizar datasets de compras públicas.
-    Cuando te indiquen el país, usa la tool 'get_sample_records' para obtener los primeros 25 registros del dataset raw.
-    Analiza esos registros y genera un mapping para transformar los campos al siguiente esquema: {TARGET_SCHEMA}.
+REGLAS_MAPPING = f"""
+    Genera un mapping para transformar los campos al siguiente esquema: {TARGET_SCHEMA}.
     El mapping debe ser un diccionario donde cada clave es el campo destino y cada valor es:
     - La ruta exacta del campo en el registro (por ejemplo: 'awards[0].value.amount', 'buyer.name', 'len(tender.tenderers)').
     - Si notas que no hay un campo que indique la moneda, quema su valor con la moneda local del país. Para hacerlo usa la sintaxis QUEMAR(valor), por ejemplo: 'moneda': 'QUEMAR(COP)'.
     - Los oferentes debe ser la cantidad de oferentes, mas qué oferentes.
     No incluyas comentarios ni condiciones en los valores del mapping, solo la ruta. Para el unico campo en el que puedes no poner la ruta es moneda, que puedes quemar su valor.
+"""
+
+normalizer_agent = Agent(
+    name="NormalizerAgent",
+    instructions=f"""
+    Eres un agente encargado de normalizar datasets de compras públicas.
+    Cuando te indiquen el país, usa la tool 'get_sample_records' para obtener 25 registros de muestra del dataset raw.
+    Analiza esos registros. {REGLAS_MAPPING}
     Luego llama a la tool 'normalize_dataset' con el país y el mapping generado para normalizar todo el dataset.
     Guarda el resultado en data/normalized/.
     """,
     tools=[get_sample_records, normalize_dataset],
     model="gpt-4o"
-)  
\ No newline at end of file
+)  
+
+mapping_agent = Agent(
+    name="MappingAgent",
+    instructions=f"""
+    Recibirás el nombre de un país y registros de muestra de su dataset raw de compras públicas.
+    {REGLAS_MAPPING}
+    """,
+    output_type=MappingDictStr,
+    model="gpt-4o"
+)
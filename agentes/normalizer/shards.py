@@ -0,0 +1,96 @@
+import os
+from concurrent.futures import as_completed, wait
+from tqdm import tqdm
+from utils.concurrencia import PROCESOS, pool_procesos
+from utils.jsonl import EscritorJsonl, concatenar, leer_rango, particionar, ruta_bloques
+from utils.serializacion import decodificar
+from agentes.normalizer.mapping import compilar_mapping, normalizar_registro
+
+MIN_BYTES_PARALELO = 32 * 1024 * 1024
+SHARDS_POR_WORKER = 4
+
+def normalizar_shard(raw_path: str, inicio: int, fin: int, mapping: dict, out_path: str, progreso=None) -> dict:
+    """
+    Normaliza el rango [inicio, fin) de raw_path (bytes si es plano, bloques si está comprimido;
+    ver particionar) y lo escribe con EscritorJsonl en out_path.
+    Se ejecuta en un proceso del pool, por eso recibe el mapping sin compilar.
+    Retorna el número de registros, el conteo por moneda, los registros con valor en cada campo
+    y los bytes del raw leídos.
+    """
+    campos = compilar_mapping(mapping)
+    monedas = {}
+    no_nulos = dict.fromkeys(mapping, 0)
+    registros = 0
+    leidos = 0
+    with EscritorJsonl(out_path) as f_out:
+        for lineas, avance in leer_rango(raw_path, inicio, fin):
+            for line in lineas:
+                if not line.strip():
+                    continue
+                norm_record = normalizar_registro(decodificar(line), campos)
+                f_out.escribir(norm_record)
+                moneda = norm_record.get("moneda")
+                monedas[moneda] = monedas.get(moneda, 0) + 1
+                for campo, valor in norm_record.items():
+                    if valor is not None:
+                        no_nulos[campo] += 1
+                registros += 1
+            leidos += avance
+            if progreso is not None:
+                progreso(avance)
+    return {"registros": registros, "monedas": monedas, "no_nulos": no_nulos, "bytes": leidos}
+
+def normalizar_archivo(raw_path: str, out_path: str, mapping: dict, workers: int = None, desc: str = "Normalizando") -> dict:
+    """
+    Normaliza raw_path en out_path sin pasada previa de conteo (el progreso va en bytes).
+    Con workers > 1 y archivos grandes divide el archivo en shards (rangos de líneas, o de bloques
+    si está comprimido, que cada proceso descomprime por su cuenta), los normaliza en el pool
+    de procesos compartido (ver pool_procesos) con el mismo mapping y concatena las salidas en orden.
+    Retorna el total de registros, el conteo por moneda y los registros con valor en cada campo.
+    """
+    mapping = dict(mapping)
+    workers = min(workers or PROCESOS, PROCESOS)
+    size = os.path.getsize(raw_path)
+
+    with tqdm(total=size, unit='B', unit_scale=True, desc=desc) as pbar:
+        if workers <= 1 or size < MIN_BYTES_PARALELO:
+            shards = particionar(raw_path, 1)
+            inicio, fin = shards[0] if shards else (0, 0)
+            return normalizar_shard(raw_path, inicio, fin, mapping, out_path, progreso=pbar.update)
+
+        shards = particionar(raw_path, workers * SHARDS_POR_WORKER)
+        part_paths = [f"{out_path}.part{i:04d}" for i in range(len(shards))]
+        resultados = [None] * len(shards)
+        try:
+            pool = pool_procesos()
+            futuros = {
+                pool.submit(normalizar_shard, raw_path, inicio, fin, mapping, part_path): i
+                for i, ((inicio, fin), part_path) in enumerate(zip(shards, part_paths))
+            }
+            try:
+                for futuro in as_completed(futuros):
+                    i = futuros[futuro]
+                    resultados[i] = futuro.result()
+                    pbar.update(resultados[i]["bytes"])
+            except BaseException:
+                # Los shards en curso terminan antes de que el finally borre sus partes
+                for futuro in futuros:
+                    futuro.cancel()
+                wait(futuros)
+                raise
+
+            concatenar(part_paths, out_path)
+        finally:
+            for part_path in part_paths:
+                for path in (part_path, ruta_bloques(part_path)):
+                    if os.path.exists(path):
+                        os.remove(path)
+
+    monedas = {}
+    no_nulos = dict.fromkeys(mapping, 0)
+    for resultado in resultados:
+        for moneda, n in resultado["monedas"].items():
+            monedas[moneda] = monedas.get(moneda, 0) + n
+        for campo, n in resultado["no_nulos"].items():
+            no_nulos[campo] += n
+    return {"registros": sum(r["registros"] for r in resultados), "monedas": monedas, "no_nulos": no_nulos}
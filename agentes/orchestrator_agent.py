@@ -1,46 +1,63 @@
-from agents import Agent, function_tool, Runner
+from agents import Agent, function_tool
 from agentes.downloader.ecuador_downloader import ecuador_agent
 from agentes.downloader.colombia_downloader import colombia_agent
 from agentes.downloader.chile_downloader import chile_agent
-from agentes.normalizer.normalizer_agent import normalizer_agent
+from agentes.normalizer.normalizer_agent import mapping_en_cache, normalizar_dataset, normalizer_agent
 from agentes.analyzer.analyzer_agent import analyzer_agent
 from agentes.reporter.reporter_agent import reporter_agent
+from utils.concurrencia import en_hilo, ejecutar_por_pais, resumen_etapa
+from utils.planificador_llm import ejecutar_agente
 
 @function_tool
 async def download_all_data(countries: list[str], year: int, search: str):
-    for country in countries:
+    async def descargar(country: str):
         if country.lower() == "ecuador":
-            await Runner.run(ecuador_agent, input=f"Descarga todos los datos de Ecuador {year} con proceso {search}")
+            result = await ejecutar_agente(ecuador_agent, f"Descarga todos los datos de Ecuador {year} con proceso {search}")
         elif country.lower() == "colombia":
-            await Runner.run(colombia_agent, input=f"Descarga los datos de Colombia {year} con proceso {search}")
+            result = await ejecutar_agente(colombia_agent, f"Descarga los datos de Colombia {year} con proceso {search}")
         elif country.lower() == "chile":
-            await Runner.run(chile_agent, input=f"Descarga los datos de Chile {year} con proceso {search}")
-    return "Download completed."
+            result = await ejecutar_agente(chile_agent, f"Descarga los datos de Chile {year} con proceso {search}")
+        else:
+            raise ValueError(f"País no soportado: {country}")
+        return str(result.final_output)
+
+    resultados = await ejecutar_por_pais(countries, descargar, "Descarga")
+    return resumen_etapa("Download completed.", resultados)
 
 @function_tool
 async def normalize_all(countries: list[str]):
-    for country in countries:
-        await Runner.run(normalizer_agent, input=f"Normaliza {country}")
-    return "Normalization completed."
+    async def normalizar(country: str):
+        # Con el mismo esquema de raw se reutiliza el mapping sin pasar por el agente
+        mapping = await en_hilo(mapping_en_cache, country)
+        if mapping is not None:
+            return await en_hilo(normalizar_dataset, country, mapping)
+        result = await ejecutar_agente(normalizer_agent, f"Normaliza {country}")
+        return str(result.final_output)
+
+    resultados = await ejecutar_por_pais(countries, normalizar, "Normalización")
+    return resumen_etapa("Normalization completed.", resultados)
 
 @function_tool
 async def analyze_all(countries: list[str]):
-    for country in countries:
-        await Runner.run(analyzer_agent, input=f"Analiza {country}")
-    return "Analysis completed."
+    async def analizar(country: str):
+        result = await ejecutar_agente(analyzer_agent, f"Analiza {country}")
+        return str(result.final_output)
+
+    resultados = await ejecutar_por_pais(countries, analizar, "Análisis")
+    return resumen_etapa("Analysis completed.", resultados)
 
 @function_tool
 async def generate_final_report():
-    await Runner.run(reporter_agent, input="Crea el reporte de presupuesto")
+    await ejecutar_agente(reporter_agent, "Crea el reporte de presupuesto")
     return "Report generated."
 
 orchestrator_agent = Agent(
     name="OrchestratorAgent",
     instructions="""
     Cuando recibas una instrucción para procesar datos de compras públicas, extrae la lista de países, el año y el tipo de proceso (search) del prompt.
-    Para cada país, llama a download_all_data con el país, año y tipo de proceso.
-    Luego, para cada país, llama a normalize_all.
-    Después, para cada país, llama a analyze_all.
+    Llama una sola vez a download_all_data con la lista completa de países, el año y el tipo de proceso; los países se descargan en paralelo.
+    Luego llama una sola vez a normalize_all con la lista completa de países.
+    Después llama una sola vez a analyze_all con la lista completa de países.
     Finalmente, llama a generate_final_report una sola vez.
     Utiliza siempre los parámetros proporcionados en el prompt.
     """,
@@ -1,18 +1,26 @@
-import json
 import pandas as pd
 import matplotlib.pyplot as plt
 from fpdf import FPDF
 from agents import Agent, function_tool
 import os
+from utils.resultados import AlmacenResultados
 
-@function_tool
-def generar_reporte():
+def generar_reporte_pdf() -> str:
+    """
+    Genera dist/informe_presupuesto.pdf con los resultados del almacén.
+    """
     try:
         dist_dir = "dist"
         os.makedirs(dist_dir, exist_ok=True)
 
-        with open("data/analiced/analisis.json", "r", encoding="utf-8") as f:
-            analysis = json.load(f)
+        almacen = AlmacenResultados()
+        try:
+            analysis = almacen.totales()
+            ejecuciones = almacen.ejecuciones()
+        finally:
+            almacen.cerrar()
+        if not analysis:
+            return "No hay resultados de análisis para generar el reporte."
 
         df = pd.DataFrame(analysis).T
         df = df[["salud", "educación", "infraestructura"]]
@@ -57,7 +65,17 @@ def generar_reporte():
                 pdf.cell(col_width, 10, f"${val:,.2f}", border=1)
             pdf.ln()
 
-        pdf.ln(10)
+        pdf.ln(6)
+        pdf.set_font("Arial", size=9)
+        for pais, meta in ejecuciones.items():
+            tasas = ", ".join(f"{moneda}={tasa:g}" for moneda, tasa in meta["tasas"].items())
+            pdf.multi_cell(0, 5, (
+                f"{pais.capitalize()}: año {meta['anio'] or '-'}, búsqueda '{meta['busqueda'] or '-'}', "
+                f"{meta['registros_clasificados'] or 0:,} registros clasificados de {meta['registros_normalizados'] or 0:,}, "
+                f"tasas USD: {tasas or '-'}"
+            ))
+
+        pdf.ln(6)
         pdf.image(png_path, x=10, w=180)
 
         pdf.output(pdf_path)
@@ -70,6 +88,10 @@ def generar_reporte():
         print(f"[generar_reporte] Error: {e}")
         return f"Error al generar el reporte: {e}"
 
+@function_tool
+def generar_reporte():
+    return generar_reporte_pdf()
+
 reporter_agent = Agent(
     name="ReporterAgent",
     instructions="""
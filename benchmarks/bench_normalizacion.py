@@ -0,0 +1,110 @@
+"""
+Micro-benchmark de la normalización: resolución de rutas por registro (antes)
+contra el mapping compilado una sola vez (después).
+
+Uso: python -m benchmarks.bench_normalizacion [num_registros]
+"""
+import random
+import sys
+import time
+
+from agentes.normalizer.mapping import MappingDict, compilar_mapping, is_quemar, normalizar_registro, resolve_path
+
+MAPPING = {
+    "id": "ocid",
+    "entidad": "buyer.name",
+    "objeto": "tender.description",
+    "presupuesto": "tender.value.amount",
+    "moneda": "QUEMAR(USD)",
+    "lugar": "parties[0].address.region",
+    "fecha_conv": "tender.tenderPeriod.startDate",
+    "fecha_adj": "awards[0].date",
+    "oferentes": "len(tender.tenderers)",
+    "proveedor": "awards[0].suppliers[0].name",
+    "valor_adj": "awards[0].value.amount",
+    "justificacion": "tender.procurementMethodRationale",
+}
+
+def generar_registros(n: int, seed: int = 7) -> list[dict]:
+    """
+    Registros sintéticos con forma OCDS, incluyendo claves e índices faltantes.
+    """
+    rnd = random.Random(seed)
+    registros = []
+    for i in range(n):
+        record = {
+            "ocid": f"ocds-{i}",
+            "buyer": {"name": f"Entidad {rnd.randint(1, 500)}"},
+            "tender": {
+                "description": f"Adquisición de insumos {rnd.randint(1, 10000)}",
+                "value": {"amount": str(rnd.uniform(100, 1e6))},
+                "tenderPeriod": {"startDate": "2023-03-01T00:00:00Z"},
+                "tenderers": [{"name": "A"}, {"name": "B"}][: rnd.randint(0, 2)],
+            },
+            "parties": [{"address": {"region": "Pichincha"}}],
+            "awards": [{
+                "date": "2023-04-01T00:00:00Z",
+                "suppliers": [{"name": "Proveedor"}],
+                "value": {"amount": rnd.uniform(100, 1e6)},
+            }],
+        }
+        if i % 7 == 0:
+            record["awards"] = []
+        if i % 11 == 0:
+            record["tender"]["tenderers"] = None
+        registros.append(record)
+    return registros
+
+def normalizar_antes(record: dict, mapping: dict) -> dict:
+    """
+    Bucle por registro tal como estaba en normalize_dataset antes de compilar el mapping.
+    """
+    norm_record = {}
+    for target, source in mapping.items():
+        tipo = MappingDict.__annotations__[target]
+        valor = None
+        if isinstance(source, str):
+            quemado = is_quemar(source)
+            if quemado is not None:
+                valor = quemado
+            else:
+                valor = resolve_path(record, source)
+        else:
+            valor = source
+
+        if valor is not None:
+            try:
+                if tipo == int:
+                    valor = int(valor)
+                elif tipo == float:
+                    valor = float(valor)
+                elif tipo == str:
+                    valor = str(valor)
+            except Exception:
+                pass
+
+        norm_record[target] = valor
+    return norm_record
+
+def medir(nombre: str, func, registros: list[dict]) -> list[dict]:
+    inicio = time.perf_counter()
+    resultado = [func(record) for record in registros]
+    segundos = time.perf_counter() - inicio
+    print(f"{nombre:<10} {len(registros) / segundos:>12,.0f} registros/s ({segundos:.2f}s)")
+    return resultado
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    registros = generar_registros(n)
+    print(f"Normalizando {n} registros sintéticos con {len(MAPPING)} campos\n")
+
+    antes = medir("antes", lambda r: normalizar_antes(r, MAPPING), registros)
+    campos = compilar_mapping(MAPPING)
+    despues = medir("después", lambda r: normalizar_registro(r, campos), registros)
+
+    if antes != despues:
+        raise SystemExit("❌ El mapping compilado no produce el mismo resultado")
+    print("\n✅ Resultados idénticos")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+Micro-benchmark de la serialización por etapa: json.dumps/json.loads por registro (antes)
+contra utils.serializacion con el backend instalado (después). Verifica además que el
+backend rápido escribe exactamente los mismos bytes que la biblioteca estándar.
+
+Uso: python -m benchmarks.bench_serializacion [num_registros]
+"""
+import dataclasses
+import datetime
+import enum
+import gc
+import json
+import sys
+import time
+import uuid
+
+from agentes.normalizer.mapping import compilar_mapping, normalizar_registro
+from benchmarks.bench_normalizacion import MAPPING, generar_registros
+from utils import serializacion
+
+# Valores donde orjson y json difieren y la salida tiene que resolverse igual
+CASOS_BORDE = [
+    {"monto": 1e16, "minimo": 1e-05, "chico": 1.234e-06, "nan": float("nan"), "inf": float("-inf")},
+    {"entero": 123456789012345678901234567890, "texto": "lote 3e+05   ñ \x00 \"comillas\""},
+    {1: "clave entera", "lista": (1, 2.5, None, True)},
+    {"uuid": uuid.UUID(int=5), "enum": enum.Enum("Estado", "ACTIVO").ACTIVO},
+]
+
+@dataclasses.dataclass
+class _Dato:
+    x: int
+
+# orjson los sabría escribir pero json no: los dos caminos deben fallar igual
+NO_SERIALIZABLES = [{"fecha": datetime.date(2024, 1, 1)}, {"dato": _Dato(1)}]
+
+def dumps_antes(record) -> bytes:
+    return (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+
+def dumps_despues(record) -> bytes:
+    return serializacion.codificar(record) + b"\n"
+
+def medir(nombre: str, func, datos: list) -> float:
+    # Sin el recolector de basura, como timeit: si no, las pasadas del GC sobre los registros
+    # ya creados se cargan a la etapa que se mida después
+    gc.collect()
+    gc.disable()
+    try:
+        inicio = time.perf_counter()
+        for dato in datos:
+            func(dato)
+        segundos = time.perf_counter() - inicio
+    finally:
+        gc.enable()
+    return len(datos) / segundos
+
+def comparar(etapa: str, antes, despues, datos: list):
+    rps_antes = medir("antes", antes, datos)
+    rps_despues = medir("después", despues, datos)
+    print(f"{etapa:<28} {rps_antes:>12,.0f} {rps_despues:>12,.0f} registros/s  x{rps_despues / rps_antes:.1f}")
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    raw = generar_registros(n)
+    campos = compilar_mapping(MAPPING)
+    normalizados = [normalizar_registro(r, campos) for r in raw]
+    clasificados = [
+        {"id": r["id"], "objeto": r["objeto"], "categoria": "salud", "fuente": "reglas",
+         "presupuesto": r["presupuesto"], "valor_adj": r["valor_adj"], "moneda": r["moneda"]}
+        for r in normalizados
+    ]
+    lineas_raw = [serializacion.codificar(r) for r in raw]
+    lineas_norm = [serializacion.codificar(r) for r in normalizados]
+    lineas_clas = [serializacion.codificar(r) for r in clasificados]
+
+    print(f"Backend: {serializacion.BACKEND}. {n} registros sintéticos\n")
+    print(f"{'etapa':<28} {'antes':>12} {'después':>12}")
+    comparar("descarga: escribir raw", dumps_antes, dumps_despues, raw)
+    comparar("normalización: leer raw", json.loads, serializacion.decodificar, lineas_raw)
+    comparar("normalización: escribir", dumps_antes, dumps_despues, normalizados)
+    comparar("clasificación: leer", json.loads, serializacion.decodificar, lineas_norm)
+    comparar("clasificación: escribir", dumps_antes, dumps_despues, clasificados)
+    comparar("análisis: leer", json.loads, serializacion.decodificar, lineas_clas)
+
+    distintos = sum(
+        serializacion.codificar(r) != serializacion.codificar_json(r)
+        for r in raw + normalizados + clasificados + CASOS_BORDE
+    )
+    leidos = sum(
+        serializacion.decodificar(serializacion.codificar_json(r)) != json.loads(serializacion.codificar_json(r))
+        for r in CASOS_BORDE
+    )
+    for r in NO_SERIALIZABLES:
+        for codificar in (serializacion.codificar, serializacion.codificar_json):
+            try:
+                codificar(r)
+                distintos += 1
+            except TypeError:
+                pass
+    if distintos or leidos:
+        raise SystemExit(f"❌ {distintos} registros con bytes distintos, {leidos} leídos distinto")
+    print("\n✅ Mismos bytes que la biblioteca estándar en todos los registros")
+
+if __name__ == "__main__":
+    main()
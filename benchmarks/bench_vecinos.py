@@ -0,0 +1,54 @@
+"""
+Evaluación del clasificador por vecinos contra etiquetas del modelo que no vio:
+separa los objetos ya clasificados en entrenamiento y prueba, y reporta la exactitud,
+la cobertura con el umbral y la velocidad de predicción.
+
+Uso: python -m benchmarks.bench_vecinos [fraccion_prueba] [umbral]
+"""
+import random
+import sys
+import tempfile
+import time
+
+from agentes.analyzer import vecinos
+
+def main():
+    fraccion = float(sys.argv[1]) if len(sys.argv) > 1 else 0.2
+    umbral = float(sys.argv[2]) if len(sys.argv) > 2 else vecinos.UMBRAL_SIMILITUD
+    if not vecinos.disponible():
+        raise SystemExit("❌ Se necesitan numpy y scipy para el clasificador por vecinos")
+
+    etiquetas = vecinos.etiquetas_clasificadas()
+    if len(etiquetas) < 10:
+        raise SystemExit("❌ No hay suficientes etiquetas del modelo en data/analiced/clasified/*.jsonl")
+
+    textos = sorted(etiquetas)
+    random.Random(7).shuffle(textos)
+    corte = int(len(textos) * (1 - fraccion))
+    entrenamiento, prueba = textos[:corte], textos[corte:]
+    print(f"{len(entrenamiento)} objetos de entrenamiento, {len(prueba)} de prueba, umbral {umbral}\n")
+
+    with tempfile.TemporaryDirectory() as directorio:
+        indice = vecinos.IndiceVecinos(directorio)
+        inicio = time.perf_counter()
+        indice.agregar({texto: etiquetas[texto] for texto in entrenamiento})
+        construccion = time.perf_counter() - inicio
+
+        inicio = time.perf_counter()
+        posiciones, similitudes = indice.vecinos(prueba)
+        prediccion = time.perf_counter() - inicio
+
+    aciertos = [indice.etiquetas[pos] == etiquetas[texto] for texto, pos in zip(prueba, posiciones)]
+    sobre_umbral = [acierto for acierto, sim in zip(aciertos, similitudes) if sim >= umbral]
+
+    print(f"construcción  {len(entrenamiento) / construccion:>12,.0f} objetos/s ({construccion:.2f}s)")
+    print(f"predicción    {len(prueba) / prediccion:>12,.0f} objetos/s ({prediccion:.2f}s)")
+    print(f"exactitud vecino más cercano: {sum(aciertos) / len(aciertos):.1%}")
+    if sobre_umbral:
+        print(f"cobertura con umbral:         {len(sobre_umbral) / len(prueba):.1%}")
+        print(f"exactitud con umbral:         {sum(sobre_umbral) / len(sobre_umbral):.1%}")
+    else:
+        print("ningún objeto de prueba supera el umbral")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Pipeline directo, sin agente orquestador: cada país pasa por descarga, normalización,
+clasificación y análisis en cuanto termina su etapa anterior, y al final se genera el reporte.
+Los modelos solo se usan donde aportan (inferir el mapping y clasificar objetos).
+
+Uso: python pipeline.py --paises ecuador colombia chile --anio 2023 --busqueda "subasta inversa"
+"""
+import argparse
+import asyncio
+import os
+import time
+from agentes.downloader.chile_downloader import CAMPOS_PROCESO, descargar_chile
+from agentes.downloader.colombia_downloader import descargar_colombia
+from agentes.downloader.ecuador_downloader import descargar_ecuador
+from agentes.normalizer.normalizer_agent import normalizar_dataset, obtener_mapping
+from agentes.analyzer.analyzer_agent import analizar_pais, clasificar_pais
+from agentes.reporter.reporter_agent import generar_reporte_pdf
+from utils.concurrencia import ErrorEtapa, ejecutar_por_pais, en_hilo, resumen_etapa
+from utils.planificador_llm import planificador
+
+PAISES = ("ecuador", "colombia", "chile")
+
+async def descargar_pais(pais: str, year: int, search: str) -> str:
+    """
+    Traduce (año, búsqueda) a los parámetros de la fuente de cada país, sin agente de descarga.
+    """
+    if pais == "ecuador":
+        response = await en_hilo(descargar_ecuador, year, search)
+    elif pais == "colombia":
+        response = await en_hilo(descargar_colombia, f"{year}-01-01", f"{year}-12-31", search)
+    elif pais == "chile":
+        response = await en_hilo(descargar_chile, year, search.split(), campos=CAMPOS_PROCESO, modo="and")
+    else:
+        raise ValueError(f"País no soportado: {pais}")
+    if response.get("status") != "ok":
+        raise ErrorEtapa(f"Descarga de {pais}: {response.get('message')}")
+    return response["message"]
+
+async def normalizar_pais(pais: str) -> str:
+    mapping = await obtener_mapping(pais)
+    return await en_hilo(normalizar_dataset, pais, mapping)
+
+async def procesar_pais(pais: str, year: int, search: str, descargar: bool = True) -> str:
+    """
+    Cadena de etapas de un país; retorna el tiempo de cada etapa.
+    """
+    tiempos = []
+
+    async def etapa(nombre: str, tarea):
+        inicio = time.perf_counter()
+        resultado = await tarea
+        tiempos.append(f"{nombre} {time.perf_counter() - inicio:.1f}s")
+        return resultado
+
+    if descargar:
+        await etapa("descarga", descargar_pais(pais, year, search))
+    await etapa("normalización", normalizar_pais(pais))
+    await etapa("clasificación", clasificar_pais(pais))
+    await etapa("análisis", analizar_pais(pais))
+    return ", ".join(tiempos)
+
+async def ejecutar_pipeline(countries: list[str], year: int, search: str,
+                            descargar: bool = True, reporte: bool = True) -> list[dict]:
+    """
+    Procesa los países en paralelo y genera el reporte con los que terminaron bien.
+    Retorna el resultado de cada país (pais, status, segundos y message).
+    """
+    paises = [pais.lower() for pais in countries]
+    resultados = await ejecutar_por_pais(
+        paises, lambda pais: procesar_pais(pais, year, search, descargar), "Pipeline"
+    )
+    print(resumen_etapa("Pipeline completado.", resultados))
+    if reporte and any(r["status"] == "ok" for r in resultados):
+        print(await en_hilo(generar_reporte_pdf))
+    return resultados
+
+def run_pipeline(countries: list[str], year: int, search: str,
+                 descargar: bool = True, reporte: bool = True) -> list[dict]:
+    """
+    Punto de entrada síncrono de ejecutar_pipeline.
+    """
+    return asyncio.run(ejecutar_pipeline(countries, year, search, descargar=descargar, reporte=reporte))
+
+def main():
+    from agents import set_default_openai_key
+    from dotenv import load_dotenv
+
+    parser = argparse.ArgumentParser(description="Descarga, normaliza, clasifica y analiza compras públicas por país.")
+    parser.add_argument("--paises", nargs="+", default=list(PAISES), choices=PAISES)
+    parser.add_argument("--anio", type=int, required=True)
+    parser.add_argument("--busqueda", required=True, help='Tipo de proceso, por ejemplo "subasta inversa"')
+    parser.add_argument("--sin-descarga", action="store_true", help="Reutiliza los archivos de data/raw")
+    parser.add_argument("--sin-reporte", action="store_true")
+    args = parser.parse_args()
+
+    load_dotenv(dotenv_path="enviroment.env")
+    set_default_openai_key(os.getenv("OPENAI_API_KEY"))
+
+    resultados = run_pipeline(
+        args.paises, args.anio, args.busqueda, descargar=not args.sin_descarga, reporte=not args.sin_reporte
+    )
+    print(f"Planificador LLM: {planificador.estadisticas()}")
+    if any(r["status"] != "ok" for r in resultados):
+        raise SystemExit(1)
+
+if __name__ == "__main__":
+    main()
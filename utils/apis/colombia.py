@@ -1,6 +1,8 @@
-import requests
-import json
 import os
+from tqdm import tqdm
+from utils.jsonl import EscritorJsonl
+from utils.serializacion import codificar, decodificar
+from utils.cliente_http import crear_sesion, descargar_en_orden, get_con_reintentos, LimitadorAdaptativo
 
 def api_colombia(
     fecha_inicio: str,
@@ -8,10 +10,15 @@ def api_colombia(
     modalidad: str,
     save_dir: str = "data/raw",
     filename: str = None,
-    append: bool = True
+    append: bool = True,
+    page_size: int = 5000,
+    max_workers: int = 4
 ):
     """
     Descarga datos de procesos de contratación de Colombia SECOP II utilizando la API de datos.gov.co.
+    Pagina con $order=:id y $offset (page_size registros por página, max_workers páginas en paralelo)
+    y escribe cada página en el archivo a medida que llega, sin límite de registros. Las páginas
+    que esperan su turno se guardan ya serializadas, no como dicts, así la memoria no crece con el total.
     Siempre retorna un dict con 'status' y 'message' para que el agente lo entienda.
     """
     try:
@@ -27,29 +34,55 @@ def api_colombia(
         filepath = os.path.join(save_dir, filename)
         
         url = "https://www.datos.gov.co/resource/p6dx-8zbt.json"
-        
-        params = {
-            "$where": f"fecha_de_publicacion_del between '{fecha_inicio}' and '{fecha_fin}' AND modalidad_de_contratacion like '%{modalidad}%'",
-            "$limit": 100000
-        }
+        where = f"fecha_de_publicacion_del between '{fecha_inicio}' and '{fecha_fin}' AND modalidad_de_contratacion like '%{modalidad}%'"
 
-        print(f"📥 Descargando datos...\n")
-        
-        response = requests.get(url, params=params)
-        if response.status_code != 200:
-            return {"status": "error", "message": f"❌ Error en la API: {response.status_code} - {response.text}"}
-        
-        data = response.json()
-        mode = "a" if append else "w"
-        with open(filepath, mode, encoding="utf-8") as f:
-            for registro in data:
-                f.write(json.dumps(registro, ensure_ascii=False) + "\n")
-        print(f"\n✅ Descarga completa: {len(data)} registros en {filepath}")
+        session = crear_sesion(pool_size=max_workers)
+        limitador = LimitadorAdaptativo(max_concurrencia=max_workers)
+
+        conteo = get_con_reintentos(session, url, {"$select": "count(*) AS total", "$where": where}, limitador).json()
+        total_esperado = int(conteo[0]["total"]) if conteo else 0
+        total_pages = (total_esperado + page_size - 1) // page_size
+
+        print(f"📥 Descargando {total_esperado} registros en {total_pages} páginas...\n")
+
+        def fetch_page(page: int):
+            params = {
+                "$where": where,
+                "$order": ":id",
+                "$limit": page_size,
+                "$offset": page * page_size
+            }
+            registros = decodificar(get_con_reintentos(session, url, params, limitador).content)
+            return [codificar(registro) for registro in registros]
+
+        total = 0
+        with EscritorJsonl(filepath, anexar=append) as f, tqdm(
+            total=total_esperado, unit="reg", desc="Descargando Colombia"
+        ) as pbar:
+            # Si se publicaron registros después del conteo, la última página llega llena y se sigue paginando
+            paginas = range(total_pages)
+            page = -1
+            while True:
+                data = []
+                for page, data in descargar_en_orden(fetch_page, paginas, max_workers):
+                    if not data:
+                        break
+                    for linea in data:
+                        f.escribir_linea(linea)
+                    total += len(data)
+                    pbar.update(len(data))
+                if len(data) < page_size:
+                    break
+                paginas = range(page + 1, page + 1 + max_workers)
+
+        session.close()
+
+        print(f"\n✅ Descarga completa: {total} registros en {filepath}")
         return {
             "status": "ok",
-            "message": f"✅ Descarga completa: {len(data)} registros en {filepath}",
+            "message": f"✅ Descarga completa: {total} registros en {filepath}",
             "filepath": filepath,
-            "total": len(data)
+            "total": total
         }
     
     except Exception as e:
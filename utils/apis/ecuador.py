@@ -1,8 +1,9 @@
-import time
-import requests
-import json
 import os
 import sys
+from utils.cache_raw import desenlazar
+from utils.jsonl import EscritorJsonl
+from utils.serializacion import decodificar
+from utils.cliente_http import crear_sesion, descargar_en_orden, get_con_reintentos, LimitadorAdaptativo
 
 def api_ecuador(
     year: int,
@@ -14,11 +15,13 @@ def api_ecuador(
     filename: str = None,
     append: bool = True,
     all: bool = False,
-    reset: bool = False 
+    reset: bool = False,
+    max_workers: int = 8
 ):
     """
     Descarga procesos de Ecuador usando la API y guarda en formato JSON Lines.
-    Incluye barra de progreso si all=True.
+    Incluye barra de progreso si all=True; las páginas se descargan en paralelo con max_workers
+    hilos sobre una sesión keep-alive y se escriben en orden.
     Si reset=True, borra el contenido del archivo antes de descargar.
     Retorna un dict con status, message, filepath y total.
     """
@@ -36,9 +39,8 @@ def api_ecuador(
             filename = f"ecuador.jsonl"
         filepath = os.path.join(save_dir, filename)
 
-        if reset and os.path.exists(filepath):
-            with open(filepath, "w", encoding="utf-8") as f:
-                pass
+        if reset:
+            desenlazar(filepath)
         
         if filename is None:
             filename = f"ecuador.jsonl"
@@ -46,87 +48,67 @@ def api_ecuador(
         filepath = os.path.join(save_dir, filename)
 
         base_url = "https://datosabiertos.compraspublicas.gob.ec/PLATAFORMA/api/search_ocds"
+
+        filtros = {}
+        if buyer:
+            filtros["buyer"] = buyer
+        if supplier:
+            filtros["supplier"] = supplier
+        if search:
+            filtros["search"] = search
+
+        session = crear_sesion(pool_size=max_workers)
+        limitador = LimitadorAdaptativo(max_concurrencia=max_workers)
         
         total_registros = 0
         
         if all:
-            init_params = {"year": year, "page": 1}
-            if buyer:
-                init_params["buyer"] = buyer
-            if supplier:
-                init_params["supplier"] = supplier
-            if search:
-                init_params["search"] = search
-
-            init_resp = requests.get(base_url, params=init_params)
-            init_resp.raise_for_status()
-            meta = init_resp.json()
+            meta = get_con_reintentos(session, base_url, {"year": year, "page": 1, **filtros}, limitador).json()
             total_pages = meta.get("pages", 1)
 
             print(f"📥 Descargando {total_pages} páginas de datos del año {year}...\n")
 
-            current_page = 1
-            while current_page <= total_pages:
-                params = {"year": year, "page": current_page}
-                if buyer:
-                    params["buyer"] = buyer
-                if supplier:
-                    params["supplier"] = supplier
-                if search:
-                    params["search"] = search
-                
-                response = requests.get(base_url, params=params)
+            def fetch_page(current_page: int):
+                if current_page == 1:
+                    return meta.get("data", [])
+                params = {"year": year, "page": current_page, **filtros}
+                return decodificar(get_con_reintentos(session, base_url, params, limitador).content).get("data", [])
 
-                if response.status_code == 429:  
-                    print("⚠️ Límite alcanzado, esperando 30 segundos...")
-                    time.sleep(30)
-                    continue
-                response.raise_for_status()
+            with EscritorJsonl(filepath, anexar=append) as f:
+                for current_page, data in descargar_en_orden(fetch_page, range(1, total_pages + 1), max_workers):
+                    if not data:
+                        break
 
-                data = response.json().get("data", [])
-                if not data:
-                    break
-                
-                mode = "a" if (append or current_page > 1) else "w"
-                with open(filepath, mode, encoding="utf-8") as f:
                     for registro in data:
-                        f.write(json.dumps(registro, ensure_ascii=False) + "\n")
-                
-                total_registros += len(data)
+                        f.escribir(registro)
+                    
+                    total_registros += len(data)
 
-                progress = int((current_page / total_pages) * 20)
-                bar = "█" * progress + "-" * (20 - progress)
-                sys.stdout.write(
-                    f"\rPág. {current_page}/{total_pages}, "
-                    f"Num. Registros {len(data)}, "
-                    f"[{bar}] {int((current_page/total_pages)*100)}%"
-                )
-                sys.stdout.flush()
-
-                current_page += 1
+                    progress = int((current_page / total_pages) * 20)
+                    bar = "█" * progress + "-" * (20 - progress)
+                    sys.stdout.write(
+                        f"\rPág. {current_page}/{total_pages}, "
+                        f"Num. Registros {len(data)}, "
+                        f"[{bar}] {int((current_page/total_pages)*100)}%"
+                    )
+                    sys.stdout.flush()
             
             print()
         
         else:
-            params = {"year": year, "page": page}
-            if buyer:
-                params["buyer"] = buyer
-            if supplier:
-                params["supplier"] = supplier
-            if search:
-                params["search"] = search
+            params = {"year": year, "page": page, **filtros}
             
-            response = requests.get(base_url, params=params)
-            response.raise_for_status()
+            response = get_con_reintentos(session, base_url, params, limitador)
             
-            data = response.json().get("data", [])
-            mode = "a" if append else "w"
-            with open(filepath, mode, encoding="utf-8") as f:
+            data = decodificar(response.content).get("data", [])
+            with EscritorJsonl(filepath, anexar=append) as f:
                 for registro in data:
-                    f.write(json.dumps(registro, ensure_ascii=False) + "\n")
+                    f.escribir(registro)
             
             print(f"Guardados {len(data)} registros en {filepath} (append={append})")
             total_registros = len(data)
+
+        session.close()
         
         print(f"\n✅ Descarga completa: {total_registros} registros en {filepath}")
         return {
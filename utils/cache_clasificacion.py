@@ -0,0 +1,87 @@
+import hashlib
+import os
+import sqlite3
+import time
+
+class CacheClasificacion:
+    """
+    Cache persistente de categorías asignadas por el clasificador, en SQLite modo WAL.
+    La clave es un hash del objeto normalizado, que es lo único que determina la clasificación.
+    Las entradas más viejas que max_dias se ignoran y, si se supera max_entradas,
+    se eliminan las menos usadas recientemente.
+    """
+
+    def __init__(self, path: str = "data/cache/clasificacion.sqlite",
+                 max_entradas: int = 2_000_000, max_dias: float = 365):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self.max_entradas = max_entradas
+        self.max_segundos = max_dias * 24 * 3600
+        self.hits = 0
+        self.misses = 0
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS clasificacion ("
+            "clave TEXT PRIMARY KEY, categoria TEXT NOT NULL, creado REAL NOT NULL, usado REAL NOT NULL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_clasificacion_usado ON clasificacion (usado)")
+        self.conn.commit()
+
+    @staticmethod
+    def clave(texto: str) -> str:
+        return hashlib.sha256(texto.encode("utf-8")).hexdigest()
+
+    def obtener(self, claves: list[str]) -> dict[str, str]:
+        """
+        Retorna {clave: categoria} para las claves vigentes en la cache y cuenta hits/misses.
+        """
+        encontradas = {}
+        vigente_desde = time.time() - self.max_segundos
+        unicas = list(dict.fromkeys(claves))
+        for i in range(0, len(unicas), 500):
+            grupo = unicas[i:i + 500]
+            marcas = ",".join("?" * len(grupo))
+            filas = self.conn.execute(
+                f"SELECT clave, categoria FROM clasificacion WHERE creado >= ? AND clave IN ({marcas})",
+                [vigente_desde, *grupo]
+            ).fetchall()
+            encontradas.update(filas)
+        if encontradas:
+            ahora = time.time()
+            self.conn.executemany("UPDATE clasificacion SET usado = ? WHERE clave = ?",
+                                  [(ahora, clave) for clave in encontradas])
+            self.conn.commit()
+        hits = sum(1 for clave in claves if clave in encontradas)
+        self.hits += hits
+        self.misses += len(claves) - hits
+        return encontradas
+
+    def guardar(self, categorias: dict[str, str]):
+        if not categorias:
+            return
+        ahora = time.time()
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO clasificacion (clave, categoria, creado, usado) VALUES (?, ?, ?, ?)",
+            [(clave, categoria, ahora, ahora) for clave, categoria in categorias.items()]
+        )
+        self.conn.commit()
+
+    def evictar(self):
+        """
+        Elimina las entradas vencidas y, si aún se supera max_entradas, las menos usadas.
+        """
+        self.conn.execute("DELETE FROM clasificacion WHERE creado < ?", (time.time() - self.max_segundos,))
+        total = self.conn.execute("SELECT COUNT(*) FROM clasificacion").fetchone()[0]
+        if total > self.max_entradas:
+            self.conn.execute(
+                "DELETE FROM clasificacion WHERE clave IN "
+                "(SELECT clave FROM clasificacion ORDER BY usado LIMIT ?)",
+                (total - self.max_entradas,)
+            )
+        self.conn.commit()
+
+    def cerrar(self):
+        self.evictar()
+        self.conn.close()
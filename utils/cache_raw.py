@@ -0,0 +1,207 @@
+import datetime
+import hashlib
+import json
+import os
+import shutil
+import time
+from utils.jsonl import es_comprimido, escribir_json_atomico, escribir_meta
+
+RAW_CACHE_DIR = "data/cache/raw"
+CUOTA_BYTES = 20 * 1024 ** 3
+CHUNK_SIZE = 1024 * 1024
+# Las consultas de un período que aún no termina se vuelven a descargar pasado este tiempo
+EDAD_MAXIMA_ABIERTO = 24 * 3600
+
+def _sha256_y_lineas(path: str) -> tuple[str, int]:
+    sha = hashlib.sha256()
+    lineas = 0
+    with open(path, "rb") as f:
+        while chunk := f.read(CHUNK_SIZE):
+            sha.update(chunk)
+            lineas += chunk.count(b"\n")
+    return sha.hexdigest(), lineas
+
+def publicar(origen: str, destino: str):
+    """
+    Deja destino apuntando al contenido de origen: hardlink si se puede, copia si no
+    (otro disco o sistema de archivos sin hardlinks). Nunca escribe sobre el archivo
+    anterior, así que una entrada de cache enlazada ahí no se modifica.
+    """
+    os.makedirs(os.path.dirname(destino) or ".", exist_ok=True)
+    if os.path.exists(destino) and os.path.samefile(origen, destino):
+        # rename() entre dos enlaces al mismo archivo no hace nada y dejaría el .tmp
+        return
+    tmp = f"{destino}.tmp"
+    if os.path.lexists(tmp):
+        os.unlink(tmp)
+    try:
+        os.link(origen, tmp)
+    except OSError:
+        shutil.copyfile(origen, tmp)
+    os.replace(tmp, destino)
+
+def edad_maxima(hasta) -> float | None:
+    """
+    Edad máxima de la entrada de cache para una consulta cuyo período termina en hasta
+    (fecha ISO o date; None si no tiene fin). Un período que incluye hoy sigue recibiendo
+    publicaciones, así que vence a las EDAD_MAXIMA_ABIERTO; uno cerrado no vence.
+    """
+    if hasta is not None and str(hasta)[:10] < datetime.date.today().isoformat():
+        return None
+    return EDAD_MAXIMA_ABIERTO
+
+def desenlazar(path: str):
+    """
+    Quita el archivo "latest" antes de volver a descargar: si es un hardlink a la cache,
+    truncarlo con open('w') corrompería la entrada.
+    """
+    if os.path.lexists(path):
+        os.unlink(path)
+
+class CacheRaw:
+    """
+    Cache de descargas raw, una entrada por (fuente, parámetros de la consulta):
+    data/cache/raw/<clave>/ con el archivo descargado y un manifest.json con tamaño,
+    registros, fecha de descarga, sha256 y metadatos. Los archivos de data/raw/ son
+    solo el "latest" de cada país (hardlink o copia de la entrada), así que las rutas
+    del normalizador no cambian. Si la cache supera cuota_bytes, se eliminan las
+    entradas usadas hace más tiempo.
+    """
+
+    def __init__(self, directorio: str = RAW_CACHE_DIR, cuota_bytes: int = CUOTA_BYTES):
+        self.directorio = directorio
+        self.cuota_bytes = cuota_bytes
+
+    @staticmethod
+    def clave(fuente: str, **params) -> str:
+        contenido = json.dumps({"fuente": fuente, "params": params}, sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(contenido.encode("utf-8")).hexdigest()[:32]
+
+    def _entrada(self, clave: str) -> str:
+        return os.path.join(self.directorio, clave)
+
+    def _manifest_path(self, clave: str) -> str:
+        return os.path.join(self._entrada(clave), "manifest.json")
+
+    def _leer_manifest(self, clave: str) -> dict | None:
+        try:
+            with open(self._manifest_path(clave), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def obtener(self, clave: str) -> dict | None:
+        """
+        Manifest de la entrada si existe y su archivo está completo; marca la entrada como usada.
+        """
+        manifest = self._leer_manifest(clave)
+        if manifest is None:
+            return None
+        path = os.path.join(self._entrada(clave), manifest["archivo"])
+        if not os.path.exists(path) or os.path.getsize(path) != manifest["bytes"]:
+            self.eliminar(clave)
+            return None
+        manifest["usado"] = time.time()
+        escribir_json_atomico(self._manifest_path(clave), manifest)
+        manifest["path"] = path
+        return manifest
+
+    def guardar(self, clave: str, origen: str, fuente: str, params: dict,
+                registros: int | None = None, meta: dict | None = None) -> dict:
+        """
+        Mueve el archivo descargado a la entrada y escribe su manifest. El origen deja de existir;
+        usa publicar() para volver a exponerlo en data/raw/.
+        """
+        entrada = self._entrada(clave)
+        os.makedirs(entrada, exist_ok=True)
+        archivo = os.path.basename(origen)
+        path = os.path.join(entrada, archivo)
+        os.replace(origen, path)
+        sha256, lineas = _sha256_y_lineas(path)
+        if registros is None and archivo.endswith(".jsonl") and not es_comprimido(path):
+            registros = lineas
+        ahora = time.time()
+        manifest = {
+            "clave": clave,
+            "fuente": fuente,
+            "params": params,
+            "archivo": archivo,
+            "bytes": os.path.getsize(path),
+            "registros": registros,
+            "sha256": sha256,
+            "descargado": ahora,
+            "usado": ahora,
+            "meta": meta or {},
+        }
+        escribir_json_atomico(self._manifest_path(clave), manifest)
+        self.evictar(conservar={clave})
+        manifest["path"] = path
+        return manifest
+
+    def eliminar(self, clave: str):
+        shutil.rmtree(self._entrada(clave), ignore_errors=True)
+
+    def evictar(self, conservar: set = frozenset()):
+        """
+        Elimina las entradas menos usadas recientemente hasta quedar bajo la cuota.
+        """
+        if not os.path.isdir(self.directorio):
+            return
+        entradas = []
+        for clave in os.listdir(self.directorio):
+            manifest = self._leer_manifest(clave)
+            if manifest is None:
+                continue
+            entradas.append((manifest.get("usado", 0), clave, manifest.get("bytes", 0)))
+        total = sum(tamano for _, _, tamano in entradas)
+        for _, clave, tamano in sorted(entradas):
+            if total <= self.cuota_bytes:
+                break
+            if clave in conservar:
+                continue
+            print(f"[cache_raw] Eliminando {clave} ({tamano / 1024 ** 2:.0f} MB) por cuota")
+            self.eliminar(clave)
+            total -= tamano
+
+def _desde_cache(manifest: dict, destino: str, aviso: str = "") -> dict:
+    publicar(manifest["path"], destino)
+    escribir_meta(destino, manifest["meta"])
+    descargado = time.strftime("%Y-%m-%d %H:%M", time.localtime(manifest["descargado"]))
+    return {
+        "status": "ok",
+        "message": f"✅ {manifest['registros']} registros desde la cache (descargados el {descargado}) en {destino}{aviso}",
+        "filepath": destino,
+        "total": manifest["registros"],
+        "cache": True,
+    }
+
+def descargar_con_cache(fuente: str, params: dict, destino: str, descargar, meta: dict,
+                        cache: CacheRaw | None = None, max_edad: float | None = None) -> dict:
+    """
+    Sirve la consulta desde la cache si ya se descargó hace menos de max_edad segundos (sin
+    límite si es None; ver edad_maxima); si no, quita el "latest" anterior, ejecuta descargar()
+    (que debe dejar el resultado en destino), guarda el archivo en la cache y lo vuelve a
+    publicar en destino. Si la descarga de una entrada vencida falla, se usa la entrada vencida.
+    En todos los casos escribe los metadatos del raw.
+    Retorna el dict de la descarga (status, message, filepath y total).
+    """
+    cache = cache or CacheRaw()
+    clave = cache.clave(fuente, **params)
+    manifest = cache.obtener(clave)
+    vencida = None
+    if manifest is not None and max_edad is not None and time.time() - manifest["descargado"] > max_edad:
+        vencida, manifest = manifest, None
+    if manifest is not None:
+        return _desde_cache(manifest, destino)
+
+    desenlazar(destino)
+    response = descargar()
+    if response.get("status") != "ok" and vencida is not None:
+        print(f"⚠️ No se pudo actualizar {fuente} ({response.get('message')}), usando la copia en cache")
+        return _desde_cache(vencida, destino, aviso=" (no se pudo actualizar)")
+    if response.get("status") == "ok":
+        meta = {**meta, "total": response["total"]}
+        manifest = cache.guardar(clave, response["filepath"], fuente, params, registros=response["total"], meta=meta)
+        publicar(manifest["path"], response["filepath"])
+        escribir_meta(response["filepath"], meta)
+    return response
@@ -0,0 +1,355 @@
+import base64
+import hashlib
+import itertools
+import json
+import os
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import parsedate_to_datetime
+
+import requests
+from requests.adapters import HTTPAdapter
+
+ESTADOS_REINTENTABLES = {429, 502, 503, 504}
+
+def crear_sesion(pool_size: int = 8) -> requests.Session:
+    """
+    Crea una sesión con pool de conexiones keep-alive del tamaño indicado.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+def parse_retry_after(value: str | None) -> float | None:
+    """
+    Convierte el header Retry-After (segundos o fecha HTTP) a segundos de espera.
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except Exception:
+        return None
+
+class LimitadorAdaptativo:
+    """
+    Limitador AIMD de concurrencia para APIs con rate limit.
+    Ante un 429/5xx reduce a la mitad las peticiones en vuelo y pausa a todos los hilos
+    el tiempo indicado por Retry-After (o un backoff exponencial si no viene);
+    con respuestas sanas vuelve a subir de a una petición hasta max_concurrencia.
+    """
+
+    def __init__(self, max_concurrencia: int = 8, min_concurrencia: int = 1,
+                 espera_base: float = 2.0, espera_max: float = 60.0):
+        self.max_concurrencia = max_concurrencia
+        self.min_concurrencia = min_concurrencia
+        self.espera_base = espera_base
+        self.espera_max = espera_max
+        self.limite = float(max_concurrencia)
+        self.en_vuelo = 0
+        self.pausa_hasta = 0.0
+        self._rechazos_seguidos = 0
+        self._cond = threading.Condition()
+
+    def adquirir(self):
+        with self._cond:
+            while True:
+                espera = self.pausa_hasta - time.monotonic()
+                if espera > 0:
+                    self._cond.wait(espera)
+                elif self.en_vuelo < int(self.limite):
+                    self.en_vuelo += 1
+                    return
+                else:
+                    self._cond.wait()
+
+    def exito(self):
+        with self._cond:
+            self.en_vuelo -= 1
+            self._rechazos_seguidos = 0
+            if self.limite < self.max_concurrencia:
+                self.limite = min(self.max_concurrencia, self.limite + 1 / self.limite)
+            self._cond.notify_all()
+
+    def rechazo(self, retry_after: float | None = None):
+        with self._cond:
+            self.en_vuelo -= 1
+            ahora = time.monotonic()
+            # Varias peticiones en vuelo reciben el mismo 429: solo la primera reduce el límite
+            if ahora >= self.pausa_hasta:
+                self._rechazos_seguidos += 1
+                self.limite = max(self.min_concurrencia, self.limite / 2)
+            if retry_after is None:
+                retry_after = min(self.espera_max, self.espera_base * 2 ** (self._rechazos_seguidos - 1))
+            self.pausa_hasta = max(self.pausa_hasta, ahora + retry_after)
+            self._cond.notify_all()
+
+    def liberar(self):
+        with self._cond:
+            self.en_vuelo -= 1
+            self._cond.notify_all()
+
+def get_con_reintentos(
+    session: requests.Session,
+    url: str,
+    params: dict = None,
+    limitador: LimitadorAdaptativo = None,
+    intentos: int = 5,
+    timeout: float = 60,
+    **kwargs
+) -> requests.Response:
+    """
+    GET a través del limitador. Reintenta 429/5xx respetando Retry-After y
+    los errores de red con backoff; cualquier otro error HTTP se lanza.
+    """
+    limitador = limitador or LimitadorAdaptativo(max_concurrencia=1)
+    fallos = 0
+    while True:
+        limitador.adquirir()
+        try:
+            response = session.get(url, params=params, timeout=timeout, **kwargs)
+        except requests.RequestException:
+            limitador.liberar()
+            fallos += 1
+            if fallos >= intentos:
+                raise
+            time.sleep(min(limitador.espera_max, limitador.espera_base * 2 ** fallos) * random.uniform(0.5, 1.0))
+            continue
+
+        if response.status_code in ESTADOS_REINTENTABLES:
+            retry_after = parse_retry_after(response.headers.get("Retry-After"))
+            limitador.rechazo(retry_after)
+            fallos += 1
+            if fallos >= intentos * 4:
+                response.raise_for_status()
+            print(f"⚠️ HTTP {response.status_code}, reduciendo a {int(limitador.limite)} peticiones en paralelo...")
+            continue
+
+        limitador.exito()
+        response.raise_for_status()
+        return response
+
+def descargar_en_orden(fetch, items, max_workers: int = 8):
+    """
+    Ejecuta fetch(item) en un pool acotado de hilos y entrega (item, resultado) en el orden de items.
+    Nunca hay más de 2 * max_workers resultados pendientes en memoria.
+    """
+    ventana = max(1, max_workers * 2)
+    items = iter(items)
+    pendientes = deque()
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        try:
+            for item in itertools.islice(items, ventana):
+                pendientes.append((item, pool.submit(fetch, item)))
+            while pendientes:
+                item, futuro = pendientes.popleft()
+                resultado = futuro.result()
+                for siguiente in itertools.islice(items, 1):
+                    pendientes.append((siguiente, pool.submit(fetch, siguiente)))
+                yield item, resultado
+        finally:
+            for _, futuro in pendientes:
+                futuro.cancel()
+
+CHUNK_DESCARGA = 4 * 1024 * 1024
+# Por debajo de este tamaño no vale la pena partir la descarga en segmentos
+MIN_BYTES_SEGMENTOS = 64 * 1024 * 1024
+
+def _validadores(response: requests.Response) -> dict:
+    return {
+        "etag": response.headers.get("ETag"),
+        "last_modified": response.headers.get("Last-Modified"),
+    }
+
+def _identidad_rangos(validadores: dict) -> str | None:
+    """
+    Validador para If-Range: un ETag débil (W/...) sirve en If-None-Match pero no para pedir
+    rangos, así que en ese caso se usa Last-Modified.
+    """
+    etag = validadores.get("etag")
+    if etag and not etag.startswith("W/"):
+        return etag
+    return validadores.get("last_modified")
+
+def _mismo_archivo(nuevos: dict, anteriores: dict) -> bool:
+    """
+    Comparación débil de validadores, la misma que usa el servidor para responder 304.
+    """
+    if nuevos.get("etag") and anteriores.get("etag"):
+        return nuevos["etag"].removeprefix("W/") == anteriores["etag"].removeprefix("W/")
+    return bool(nuevos.get("last_modified")) and nuevos["last_modified"] == anteriores.get("last_modified")
+
+def _leer_estado(path: str) -> dict | None:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def _escribir_estado(path: str, estado: dict):
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(estado, f)
+    os.replace(tmp, path)
+
+def _digest_servidor(response: requests.Response) -> tuple[str, str] | None:
+    """
+    Checksum publicado por el servidor (Digest: sha-256=... o Content-MD5), como (algoritmo, hex).
+    """
+    digest = response.headers.get("Digest") or ""
+    for parte in digest.split(","):
+        algoritmo, _, valor = parte.strip().partition("=")
+        if algoritmo.lower() in ("sha-256", "md5") and valor:
+            return algoritmo.lower().replace("-", ""), base64.b64decode(valor).hex()
+    md5 = response.headers.get("Content-MD5")
+    if md5:
+        return "md5", base64.b64decode(md5).hex()
+    return None
+
+def _escribir_respuesta(response: requests.Response, f, pbar, desde: int = 0) -> int:
+    f.seek(desde)
+    escritos = 0
+    for chunk in response.iter_content(chunk_size=CHUNK_DESCARGA):
+        f.write(chunk)
+        escritos += len(chunk)
+        if pbar is not None:
+            pbar.update(len(chunk))
+    return escritos
+
+def descargar_archivo(url: str, destino: str, validadores: dict | None = None, segmentos: int = 4,
+                      session: requests.Session = None, desc: str = None) -> dict:
+    """
+    Descarga url en destino con:
+    - petición condicional (If-None-Match / If-Modified-Since) si destino existe y se pasan los
+      validadores de la descarga anterior: un 304 no transfiere nada,
+    - reanudación de una descarga cortada (destino.part) con Range + If-Range, si el archivo
+      del servidor no cambió,
+    - segmentos descargas por rangos en paralelo cuando el servidor acepta rangos,
+    - verificación del tamaño contra Content-Length y del checksum si el servidor lo publica.
+    Retorna {"sin_cambios", "etag", "last_modified", "bytes"}.
+    """
+    from tqdm import tqdm
+
+    session = session or crear_sesion(pool_size=max(1, segmentos))
+    os.makedirs(os.path.dirname(destino) or ".", exist_ok=True)
+    part_path = f"{destino}.part"
+    estado_path = f"{part_path}.json"
+    validadores = validadores or {}
+
+    headers = {}
+    if os.path.exists(destino):
+        if validadores.get("etag"):
+            headers["If-None-Match"] = validadores["etag"]
+        if validadores.get("last_modified"):
+            headers["If-Modified-Since"] = validadores["last_modified"]
+    response = get_con_reintentos(session, url, headers=headers, stream=True)
+    if response.status_code == 304:
+        response.close()
+        return {"sin_cambios": True, **validadores, "bytes": os.path.getsize(destino)}
+
+    nuevos = _validadores(response)
+    total = int(response.headers.get("Content-Length") or 0)
+    acepta_rangos = response.headers.get("Accept-Ranges", "").lower() == "bytes" and total > 0
+    identidad = _identidad_rangos(nuevos)
+    if os.path.exists(destino) and _mismo_archivo(nuevos, validadores):
+        # El servidor ignoró la petición condicional pero el archivo es el mismo
+        response.close()
+        return {"sin_cambios": True, **validadores, "bytes": os.path.getsize(destino)}
+    digest = _digest_servidor(response)
+
+    # Una descarga anterior del mismo archivo quedó a medias: se reanuda en vez de empezar de cero
+    estado = _leer_estado(estado_path) if os.path.exists(part_path) else None
+    if not (estado and identidad and acepta_rangos and estado.get("identidad") == identidad and estado.get("total") == total):
+        estado = None
+        for path in (part_path, estado_path):
+            if os.path.exists(path):
+                os.unlink(path)
+
+    if estado is None:
+        num = segmentos if segmentos > 1 and acepta_rangos and identidad and total >= MIN_BYTES_SEGMENTOS else 1
+        tamano = -(-total // num) if total else 0
+        estado = {
+            "identidad": identidad,
+            "total": total,
+            "rangos": [[i * tamano, min(total, (i + 1) * tamano) - 1] for i in range(num)] if num > 1 else [[0, None]],
+            "completados": [],
+        }
+        with open(part_path, "wb") as f:
+            if num > 1:
+                f.truncate(total)
+        _escribir_estado(estado_path, estado)
+    lock = threading.Lock()
+
+    def marcar(i):
+        with lock:
+            estado["completados"].append(i)
+            _escribir_estado(estado_path, estado)
+
+    pendientes = [i for i in range(len(estado["rangos"])) if i not in estado["completados"]]
+    ya_descargado = total - sum(
+        (fin if fin is not None else total - 1) - inicio + 1 for i, (inicio, fin) in enumerate(estado["rangos"]) if i in pendientes
+    ) if total else 0
+    with tqdm(total=total or None, initial=ya_descargado, unit="B", unit_scale=True, desc=desc or os.path.basename(destino)) as pbar:
+        if len(estado["rangos"]) == 1:
+            inicio = os.path.getsize(part_path)
+            if inicio and acepta_rangos:
+                # Reanuda una descarga secuencial cortada desde el último byte escrito
+                response.close()
+                pbar.update(inicio - pbar.n)
+                print(f"⏯️ Reanudando {os.path.basename(destino)} desde {inicio / 1024 ** 2:.0f} MB")
+                response = get_con_reintentos(session, url, stream=True,
+                                              headers={"Range": f"bytes={inicio}-", "If-Range": identidad})
+                if response.status_code != 206:
+                    inicio = 0
+                    pbar.reset(total)
+            else:
+                inicio = 0
+            with open(part_path, "r+b" if inicio else "wb", buffering=CHUNK_DESCARGA) as f:
+                _escribir_respuesta(response, f, pbar, desde=inicio)
+                f.truncate()
+            response.close()
+        else:
+            response.close()
+
+            def bajar(i):
+                inicio, fin = estado["rangos"][i]
+                r = get_con_reintentos(session, url, stream=True,
+                                       headers={"Range": f"bytes={inicio}-{fin}", "If-Range": identidad})
+                with r:
+                    if r.status_code != 206:
+                        raise IOError(f"El servidor no respetó el rango {inicio}-{fin} (HTTP {r.status_code})")
+                    with open(part_path, "r+b", buffering=CHUNK_DESCARGA) as f:
+                        escritos = _escribir_respuesta(r, f, pbar, desde=inicio)
+                if escritos != fin - inicio + 1:
+                    raise IOError(f"Segmento {inicio}-{fin} incompleto: {escritos} bytes")
+                marcar(i)
+
+            with ThreadPoolExecutor(max_workers=len(pendientes) or 1) as pool:
+                list(pool.map(bajar, pendientes))
+
+    tamano = os.path.getsize(part_path)
+    if total and tamano != total:
+        # El .part y su estado quedan para reanudar en la próxima ejecución
+        raise IOError(f"Descarga incompleta de {url}: {tamano} de {total} bytes")
+    if digest is not None:
+        algoritmo, esperado = digest
+        h = hashlib.new(algoritmo)
+        with open(part_path, "rb") as f:
+            while chunk := f.read(CHUNK_DESCARGA):
+                h.update(chunk)
+        if h.hexdigest() != esperado:
+            os.unlink(part_path)
+            os.unlink(estado_path)
+            raise IOError(f"Checksum {algoritmo} de {url} no coincide")
+    os.replace(part_path, destino)
+    os.unlink(estado_path)
+    return {"sin_cambios": False, **nuevos, "bytes": tamano}
@@ -0,0 +1,70 @@
+import asyncio
+import functools
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="compras")
+
+PROCESOS = os.cpu_count() or 1
+_pool_procesos = None
+_lock_procesos = threading.Lock()
+
+class ErrorEtapa(Exception):
+    """
+    Una etapa de un país terminó sin su resultado; las etapas siguientes de ese país no se ejecutan.
+    Las tools la convierten en el mensaje que reciben los agentes.
+    """
+
+async def en_hilo(func, *args, **kwargs):
+    """
+    Ejecuta una función bloqueante en el pool de hilos compartido sin bloquear el event loop.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, functools.partial(func, *args, **kwargs))
+
+def pool_procesos() -> ProcessPoolExecutor:
+    """
+    Pool de procesos compartido por todos los países: las etapas que corren a la vez se reparten
+    PROCESOS workers en lugar de crear cada una los suyos.
+    Arranca con forkserver (spawn donde no existe): un fork de este proceso, con el event loop y
+    el pool de hilos corriendo, puede dejar al hijo bloqueado en un lock tomado por otro hilo.
+    """
+    global _pool_procesos
+    with _lock_procesos:
+        # Un worker que muere deja el pool roto para siempre; se crea uno nuevo
+        if _pool_procesos is None or _pool_procesos._broken:
+            metodo = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+            _pool_procesos = ProcessPoolExecutor(max_workers=PROCESOS, mp_context=multiprocessing.get_context(metodo))
+        return _pool_procesos
+
+async def ejecutar_por_pais(paises: list[str], tarea, etapa: str):
+    """
+    Ejecuta tarea(pais) para todos los países a la vez.
+    El error de un país no cancela a los demás; cada país reporta su propio tiempo.
+    Retorna una lista de dicts con pais, status, segundos y message.
+    """
+    async def ejecutar(pais: str):
+        inicio = time.perf_counter()
+        try:
+            message = await tarea(pais)
+            status = "ok"
+        except Exception as e:
+            message = f"❌ Excepción: {str(e)}"
+            status = "error"
+        segundos = time.perf_counter() - inicio
+        print(f"⏱️ {etapa} {pais}: {segundos:.1f}s ({status})")
+        return {"pais": pais, "status": status, "segundos": segundos, "message": message}
+
+    return await asyncio.gather(*(ejecutar(pais) for pais in paises))
+
+def resumen_etapa(titulo: str, resultados: list[dict]) -> str:
+    """
+    Arma el texto que las tools devuelven al agente con el resultado y el tiempo de cada país.
+    """
+    lineas = [titulo]
+    for r in resultados:
+        lineas.append(f"- {r['pais']}: {r['status']} en {r['segundos']:.1f}s. {r['message']}")
+    return "\n".join(lineas)
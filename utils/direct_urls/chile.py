@@ -1,7 +1,52 @@
 import requests
 import os
-import gzip
+from contextlib import ExitStack
 from tqdm import tqdm
+from utils.filtros import FiltroKeywords
+from utils.cache_raw import desenlazar
+from utils.cliente_http import descargar_archivo
+from utils.indice_raw import ConstructorIndice, IndiceRaw
+from utils.jsonl import EscritorJsonl, es_comprimido, lineas_gzip
+
+CHUNK_SIZE = 1024 * 1024
+URL_ANUAL = "https://data.open-contracting.org/es/publication/144/download?name={year}.jsonl.gz"
+
+def descargar_anual(year: int, gz_path: str, validadores: dict = None, segmentos: int = 4) -> dict:
+    """
+    Descarga el .jsonl.gz del año solo si cambió desde la descarga con esos validadores (ETag/Last-Modified),
+    reanudando una descarga cortada y partiéndola en segmentos paralelos si el servidor acepta rangos.
+    """
+    return descargar_archivo(URL_ANUAL.format(year=year), gz_path, validadores=validadores,
+                             segmentos=segmentos, desc=f"Descargando Chile {year}")
+
+def _leer_chunks(f, pbar):
+    """
+    Lee un archivo binario por bloques actualizando la barra de progreso.
+    """
+    while True:
+        chunk = f.read(CHUNK_SIZE)
+        if not chunk:
+            break
+        pbar.update(len(chunk))
+        yield chunk
+
+def _leer_lineas(f, pbar):
+    """
+    Lee un archivo JSONL binario línea a línea actualizando la barra de progreso por bytes.
+    """
+    for line in f:
+        pbar.update(len(line))
+        yield line.rstrip(b"\n")
+
+def _descargar_chunks(response, gz_file, pbar):
+    """
+    Entrega los bloques comprimidos de la respuesta y, si gz_file no es None, los guarda en disco.
+    """
+    for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+        if gz_file is not None:
+            gz_file.write(chunk)
+        pbar.update(len(chunk))
+        yield chunk
 
 def url_chile(
     year: int,
@@ -9,10 +54,25 @@ def url_chile(
     save_dir: str = "data/raw",
     filename: str = None,
     skip_download: bool = False,
-    skip_extract: bool = False
+    skip_extract: bool = False,
+    guardar_sin_filtrar: bool = False,
+    guardar_gz: bool = True,
+    campos: list[str] = None,
+    modo: str = "or",
+    indexar: bool = False,
+    origen: str = None
 ):
     """
     Descarga, extrae y filtra el JSON de Chile de la plataforma Open Contracting para un año específico.
+    El gzip se descomprime y filtra en streaming en una sola pasada mientras se descarga:
+    el JSONL sin filtrar solo se escribe en disco con guardar_sin_filtrar=True (o si no hay search).
+    - skip_download: usa el .jsonl.gz ya descargado.
+    - skip_extract: filtra el chile_sin_filtrar.jsonl ya extraído.
+    - guardar_gz: conserva el .jsonl.gz descargado para poder usar skip_download después.
+    - campos: rutas OCDS donde buscar las keywords (ej: ['tender.title']); None busca en todo el registro.
+    - modo: 'or' (alguna keyword) o 'and' (todas).
+    - indexar: construye en la misma pasada el índice del JSONL sin filtrar (ver utils/indice_raw),
+      marcado con origen, para que las búsquedas siguientes no vuelvan a descomprimir el año.
     Retorna un dict con status, message, filepath y total.
     """
     try:
@@ -25,73 +85,78 @@ def url_chile(
         gz_path = os.path.join(save_dir, gz_filename)
         jsonl_filename = gz_filename.replace(".gz", "")
         jsonl_path = os.path.join(save_dir, jsonl_filename)
+        filtered_path = os.path.join(save_dir, filename)
+
+        if not search:
+            guardar_sin_filtrar = True
+
+        with ExitStack() as stack:
+            # ORIGEN
+            if skip_extract:
+                if not os.path.exists(jsonl_path):
+                    return {
+                        "status": "error",
+                        "message": f"❌ skip_extract=True pero no se encontró el archivo {jsonl_path}"
+                    }
+                print(f"⚡ Saltando descarga y extracción, usando {jsonl_path}")
+                guardar_sin_filtrar = False
+                f_in = stack.enter_context(open(jsonl_path, "rb"))
+                pbar = stack.enter_context(tqdm(
+                    total=os.path.getsize(jsonl_path), unit='B', unit_scale=True, desc=f"Filtrando {jsonl_filename}"
+                ))
+                lineas = lineas_gzip(_leer_chunks(f_in, pbar)) if es_comprimido(jsonl_path) else _leer_lineas(f_in, pbar)
+            elif skip_download:
+                if not os.path.exists(gz_path):
+                    return {
+                        "status": "error",
+                        "message": f"❌ skip_download=True pero no se encontró el archivo {gz_path}"
+                    }
+                print(f"⚡ Saltando descarga, usando {gz_path}")
+                f_in = stack.enter_context(open(gz_path, "rb"))
+                pbar = stack.enter_context(tqdm(
+                    total=os.path.getsize(gz_path), unit='B', unit_scale=True, desc=f"Procesando {gz_filename}"
+                ))
+                lineas = lineas_gzip(_leer_chunks(f_in, pbar))
+            else:
+                url = URL_ANUAL.format(year=year)
+                response = stack.enter_context(requests.get(url, stream=True))
+                response.raise_for_status()
+                total_size = int(response.headers.get('content-length', 0))
+                if guardar_gz:
+                    desenlazar(gz_path)
+                gz_file = stack.enter_context(open(gz_path, "wb")) if guardar_gz else None
+                pbar = stack.enter_context(tqdm(
+                    total=total_size, unit='B', unit_scale=True, desc=f"Descargando y procesando {gz_filename}"
+                ))
+                lineas = lineas_gzip(_descargar_chunks(response, gz_file, pbar))
+
+            # DESTINOS
+            f_sin_filtrar = stack.enter_context(EscritorJsonl(jsonl_path)) if guardar_sin_filtrar else None
+            f_filtrado = stack.enter_context(EscritorJsonl(filtered_path)) if search else None
+            filtro = FiltroKeywords(search, campos=campos, modo=modo) if search else None
+            indice = ConstructorIndice(jsonl_path, origen=origen) if indexar and f_sin_filtrar is not None else None
 
-        # DESCARGA
-        if not skip_download:
-            url = f"https://data.open-contracting.org/es/publication/144/download?name={year}.jsonl.gz"
-            response = requests.get(url, stream=True)
-            response.raise_for_status()
-            
-            total_size = int(response.headers.get('content-length', 0))
-            chunk_size = 8192
-            
-            with open(gz_path, "wb") as f, tqdm(
-                total=total_size, unit='B', unit_scale=True, desc=f"Descargando {gz_filename}"
-            ) as pbar:
-                for chunk in response.iter_content(chunk_size=chunk_size):
-                    f.write(chunk)
-                    pbar.update(len(chunk))
+            # FILTRADO (una sola pasada)
+            total_lines = 0
+            matches = 0
+            for line in lineas:
+                total_lines += 1
+                if f_sin_filtrar is not None:
+                    f_sin_filtrar.escribir_linea(line)
+                    if indice is not None:
+                        indice.agregar(line)
+                if filtro is not None and filtro.coincide(line):
+                    f_filtrado.escribir_linea(line)
+                    matches += 1
+
+        if indice is not None:
+            indice.guardar()
+        if not skip_download and not skip_extract and guardar_gz:
             print(f"✅ Archivo descargado en {gz_path}")
-        else:
-            if not os.path.exists(gz_path):
-                return {
-                    "status": "error",
-                    "message": f"❌ skip_download=True pero no se encontró el archivo {gz_path}"
-                }
-            print(f"⚡ Saltando descarga, usando {gz_path}")
-
-        # EXTRACCIÓN
-        if not skip_extract:
-            gz_size = os.path.getsize(gz_path)
-            chunk_size = 8192
-            aprox_jsonl_size = gz_size * 9.88
-
-            with gzip.open(gz_path, 'rb') as f_in, open(jsonl_path, 'wb') as f_out, tqdm(
-                total=aprox_jsonl_size, unit='B', unit_scale=True, desc=f"Extrayendo {jsonl_filename}"
-            ) as pbar:
-                while True:
-                    chunk = f_in.read(chunk_size)
-                    if not chunk:
-                        break
-                    f_out.write(chunk)
-                    pbar.update(len(chunk))
+        if guardar_sin_filtrar:
             print(f"✅ Archivo extraído en {jsonl_path}")
-        else:
-            if not os.path.exists(jsonl_path):
-                return {
-                    "status": "error",
-                    "message": f"❌ skip_extract=True pero no se encontró el archivo {jsonl_path}"
-                }
-            print(f"⚡ Saltando extracción, usando {jsonl_path}")
-
-        # FILTRADO
+
         if search:
-            search_lower = [s.lower() for s in search]
-            filtered_path = os.path.join(save_dir, filename)
-            total_lines = sum(1 for _ in open(jsonl_path, 'r', encoding='utf-8'))
-            matches = 0
-            with open(jsonl_path, 'r', encoding='utf-8') as fin, open(filtered_path, 'w', encoding='utf-8') as fout, tqdm(
-                total=total_lines, desc=f"Filtrando registros por keywords"
-            ) as pbar:
-                for line in fin:
-                    try:
-                        line_lower = line.lower()
-                        if any(keyword in line_lower for keyword in search_lower):
-                            fout.write(line)
-                            matches += 1
-                    except:
-                        pass
-                    pbar.update(1)
             print(f"✅ Archivo filtrado guardado en {filtered_path}")
             return {
                 "status": "ok",
@@ -101,7 +166,6 @@ def url_chile(
             }
 
         # GUARDADO
-        total_lines = sum(1 for _ in open(jsonl_path, 'r', encoding='utf-8'))
         print(f"✅ Archivo final listo en {jsonl_path} con {total_lines} registros")
         return {
             "status": "ok",
@@ -113,3 +177,45 @@ def url_chile(
     except Exception as e:
         print(f"❌ Excepción: {str(e)}")
         return {"status": "error", "message": f"❌ Excepción: {str(e)}"}
+
+def filtrar_indexado(
+    indice: IndiceRaw,
+    search: list[str],
+    save_dir: str = "data/raw",
+    filename: str = "chile.jsonl",
+    campos: list[str] = None,
+    modo: str = "or"
+):
+    """
+    Filtra el JSONL sin filtrar ya indexado: las postings de keywords dan los candidatos y solo esas
+    líneas se leen (con mmap) y se confirman con FiltroKeywords. Si el índice no cubre los campos
+    pedidos recorre todas las líneas, pero sin descomprimir el .jsonl.gz.
+    Retorna un dict con status, message, filepath y total, como url_chile.
+    """
+    try:
+        filtered_path = os.path.join(save_dir, filename)
+        filtro = FiltroKeywords(search, campos=campos, modo=modo)
+        candidatos = indice.candidatos(search, campos, modo)
+        total = len(indice) if candidatos is None else len(candidatos)
+        print(f"⚡ Usando el índice de {indice.path}: {total} de {len(indice)} registros candidatos")
+        matches = 0
+        with EscritorJsonl(filtered_path) as f_filtrado, tqdm(
+            total=total, unit=" registros", desc=f"Filtrando {os.path.basename(indice.path)}"
+        ) as pbar:
+            for line in indice.lineas(candidatos):
+                pbar.update(1)
+                if filtro.coincide(line):
+                    f_filtrado.escribir_linea(line)
+                    matches += 1
+        print(f"✅ Archivo filtrado guardado en {filtered_path}")
+        return {
+            "status": "ok",
+            "message": f"✅ Descarga y filtrado completo: {matches} registros en {filtered_path}",
+            "filepath": filtered_path,
+            "total": matches
+        }
+    except Exception as e:
+        print(f"❌ Excepción: {str(e)}")
+        return {"status": "error", "message": f"❌ Excepción: {str(e)}"}
+    finally:
+        indice.cerrar()
@@ -0,0 +1,63 @@
+import json
+import re
+from utils.rutas import partes_ruta, valores_ruta
+from utils.serializacion import decodificar
+
+def _patron_bytes(keyword: str) -> bytes:
+    """
+    Patrón en bytes que encuentra la keyword en una línea JSON sin decodificarla:
+    los caracteres no ASCII admiten mayúscula/minúscula en UTF-8 y su escape \\uXXXX.
+    """
+    partes = []
+    for ch in keyword:
+        if ord(ch) < 128:
+            partes.append(re.escape(ch.encode("utf-8")))
+            continue
+        variantes = []
+        for v in {ch.lower(), ch.upper()}:
+            variantes.append(re.escape(v.encode("utf-8")))
+            variantes.append(re.escape(json.dumps(v)[1:-1].encode("ascii")))
+        partes.append(b"(?:" + b"|".join(variantes) + b")")
+    return b"".join(partes)
+
+class FiltroKeywords:
+    """
+    Filtro de registros JSONL por keywords, compilado una sola vez.
+    - keywords: palabras a buscar (sin distinguir mayúsculas).
+    - campos: rutas OCDS donde buscar (ej: 'tender.title'); si es None se busca en toda la línea.
+    - modo: 'or' (alguna keyword) o 'and' (todas las keywords).
+    Primero descarta en bytes las líneas que no contienen ninguna keyword y solo
+    parsea el JSON de las candidatas cuando hay que mirar campos concretos.
+    """
+
+    def __init__(self, keywords: list[str], campos: list[str] = None, modo: str = "or"):
+        modo = (modo or "or").lower()
+        if modo not in ("or", "and"):
+            raise ValueError(f"modo debe ser 'or' o 'and', no '{modo}'")
+        self.keywords = sorted({k.lower() for k in keywords if k}, key=len, reverse=True)
+        if not self.keywords:
+            raise ValueError("Debes indicar al menos una keyword")
+        self.modo = modo
+        self.campos = [partes_ruta(c) for c in campos] if campos else None
+
+        self._bytes_alguna = re.compile(b"|".join(_patron_bytes(k) for k in self.keywords), re.IGNORECASE)
+        self._bytes_cada = [re.compile(_patron_bytes(k), re.IGNORECASE) for k in self.keywords]
+        self._texto_alguna = re.compile("|".join(re.escape(k) for k in self.keywords), re.IGNORECASE)
+        self._texto_cada = [re.compile(re.escape(k), re.IGNORECASE) for k in self.keywords]
+
+    def _busca(self, texto, alguna, cada) -> bool:
+        if self.modo == "or":
+            return alguna.search(texto) is not None
+        return all(r.search(texto) for r in cada)
+
+    def coincide(self, line: bytes) -> bool:
+        if not self._busca(line, self._bytes_alguna, self._bytes_cada):
+            return False
+        if self.campos is None:
+            return True
+        try:
+            record = decodificar(line)
+        except ValueError:
+            return False
+        texto = "\n".join(v for partes in self.campos for v in valores_ruta(record, partes))
+        return self._busca(texto, self._texto_alguna, self._texto_cada)
@@ -0,0 +1,378 @@
+import hashlib
+import json
+import mmap
+import os
+import re
+import shutil
+import zlib
+from array import array
+import numpy as np
+from utils.jsonl import es_comprimido, iterar_lineas, leer_bloque, leer_bloques
+from utils.rutas import partes_ruta, valores_ruta
+from utils.serializacion import decodificar
+
+VERSION_INDICE = 1
+# Rutas OCDS de cada atributo indexado; se usa la primera que tenga valor
+ATRIBUTOS = {
+    "ocid": ["ocid"],
+    "fecha": ["tender.tenderPeriod.startDate", "date"],
+    "metodo": ["tender.procurementMethodDetails", "tender.procurementMethod"],
+    "comprador": ["buyer.name"],
+}
+CAMPOS_TEXTO = ["tender.title", "tender.description", "tender.procurementMethodDetails"]
+TOKEN = re.compile(r"\w+")
+FECHA = re.compile(r"(\d{4})-(\d{2})-(\d{2})")
+# Archivos más chicos que esto se muestrean leyéndolos enteros
+MAX_BYTES_LECTURA_COMPLETA = 8 * 1024 * 1024
+
+def ruta_indice(path: str) -> str:
+    """
+    Directorio del índice de un JSONL: data/raw/chile_sin_filtrar.jsonl -> chile_sin_filtrar.jsonl.idx/
+    """
+    return f"{path}.idx"
+
+def _fecha(valor: str | None) -> int:
+    """
+    'AAAA-MM-DD...' como entero AAAAMMDD; 0 si no hay fecha.
+    """
+    m = FECHA.match(valor or "")
+    return int("".join(m.groups())) if m else 0
+
+def _hash_ocid(ocid: str) -> int:
+    return int.from_bytes(hashlib.blake2b(ocid.encode("utf-8"), digest_size=8).digest(), "little")
+
+def _huella(path: str) -> dict:
+    stat = os.stat(path)
+    return {"bytes": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+class _Vocabulario:
+    def __init__(self):
+        self.codigos = {}
+
+    def codigo(self, valor: str | None) -> int:
+        if valor is None:
+            return -1
+        return self.codigos.setdefault(valor, len(self.codigos))
+
+    def valores(self) -> list[str]:
+        return list(self.codigos)
+
+class ConstructorIndice:
+    """
+    Construye en una sola pasada el índice de un JSONL mientras se escribe (o se lee) línea a línea:
+    offset y largo de cada registro en el texto sin comprimir, ocid, fecha, método, comprador y listas
+    de postings de las palabras de campos_texto. agregar() recibe cada línea sin el salto de línea,
+    en el orden del archivo.
+    """
+
+    def __init__(self, path: str, campos_texto: list[str] = None, origen: str | None = None):
+        self.path = path
+        self.campos_texto = list(campos_texto or CAMPOS_TEXTO)
+        self.origen = origen
+        self._rutas = {nombre: [partes_ruta(r) for r in rutas] for nombre, rutas in ATRIBUTOS.items()}
+        self._rutas_texto = [partes_ruta(c) for c in self.campos_texto]
+        self.pos = 0
+        self.offsets = array("q")
+        self.largos = array("i")
+        self.fechas = array("i")
+        self.ocids = array("Q")
+        self.metodos = array("i")
+        self.compradores = array("i")
+        self.vocab_metodos = _Vocabulario()
+        self.vocab_compradores = _Vocabulario()
+        self.terminos = _Vocabulario()
+        # Pares (término, registro) de las postings, sin ordenar
+        self.post_terminos = array("i")
+        self.post_registros = array("i")
+
+    def _primero(self, record: dict, nombre: str) -> str | None:
+        for partes in self._rutas[nombre]:
+            for valor in valores_ruta(record, partes):
+                return valor
+        return None
+
+    def agregar(self, line: bytes):
+        inicio = self.pos
+        self.pos += len(line) + 1
+        if not line.strip():
+            return
+        try:
+            record = decodificar(line)
+        except ValueError:
+            return
+        registro = len(self.offsets)
+        self.offsets.append(inicio)
+        self.largos.append(len(line))
+        self.ocids.append(_hash_ocid(self._primero(record, "ocid") or ""))
+        self.fechas.append(_fecha(self._primero(record, "fecha")))
+        self.metodos.append(self.vocab_metodos.codigo(self._primero(record, "metodo")))
+        self.compradores.append(self.vocab_compradores.codigo(self._primero(record, "comprador")))
+        texto = " ".join(v for partes in self._rutas_texto for v in valores_ruta(record, partes)).lower()
+        for termino in set(TOKEN.findall(texto)):
+            self.post_terminos.append(self.terminos.codigo(termino))
+            self.post_registros.append(registro)
+
+    def guardar(self):
+        """
+        Escribe el índice junto al JSONL (que ya debe estar cerrado) y lo reemplaza de forma atómica.
+        """
+        destino = ruta_indice(self.path)
+        tmp = f"{destino}.tmp"
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(tmp)
+
+        # Términos en orden alfabético con sus registros contiguos
+        terminos = self.terminos.valores()
+        orden_terminos = sorted(range(len(terminos)), key=terminos.__getitem__)
+        rango = np.empty(len(terminos), dtype=np.int32)
+        rango[orden_terminos] = np.arange(len(terminos), dtype=np.int32)
+        post_terminos = rango[np.frombuffer(self.post_terminos, dtype=np.int32)] if terminos else np.empty(0, np.int32)
+        orden = np.argsort(post_terminos, kind="stable")
+        inicios = np.zeros(len(terminos) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(post_terminos, minlength=len(terminos)), out=inicios[1:])
+
+        ocids = np.frombuffer(self.ocids, dtype=np.uint64)
+        orden_ocids = np.argsort(ocids, kind="stable").astype(np.int32)
+        arreglos = {
+            "offsets": np.frombuffer(self.offsets, dtype=np.int64),
+            "largos": np.frombuffer(self.largos, dtype=np.int32),
+            "fechas": np.frombuffer(self.fechas, dtype=np.int32),
+            "metodos": np.frombuffer(self.metodos, dtype=np.int32),
+            "compradores": np.frombuffer(self.compradores, dtype=np.int32),
+            "ocids": ocids[orden_ocids],
+            "orden_ocids": orden_ocids,
+            "postings": np.frombuffer(self.post_registros, dtype=np.int32)[orden],
+            "postings_inicio": inicios,
+        }
+        for nombre, arreglo in arreglos.items():
+            np.save(os.path.join(tmp, f"{nombre}.npy"), arreglo)
+        with open(os.path.join(tmp, "vocabularios.json"), "w", encoding="utf-8") as f:
+            json.dump({
+                "metodos": self.vocab_metodos.valores(),
+                "compradores": self.vocab_compradores.valores(),
+                "terminos": [terminos[i] for i in orden_terminos],
+            }, f, ensure_ascii=False)
+        # meta.json va al final: un índice sin meta no se considera válido
+        with open(os.path.join(tmp, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump({
+                "version": VERSION_INDICE,
+                **_huella(self.path),
+                "registros": len(self.offsets),
+                "origen": self.origen,
+                "campos_texto": self.campos_texto,
+            }, f, ensure_ascii=False, indent=2)
+        shutil.rmtree(destino, ignore_errors=True)
+        os.replace(tmp, destino)
+
+def construir_indice(path: str, campos_texto: list[str] = None, origen: str | None = None):
+    """
+    Indexa un JSONL ya escrito, en una pasada.
+    """
+    constructor = ConstructorIndice(path, campos_texto=campos_texto, origen=origen)
+    for line in iterar_lineas(path):
+        constructor.agregar(line)
+    constructor.guardar()
+
+class IndiceRaw:
+    """
+    Índice de un JSONL raw abierto con mmap: las consultas por método, comprador, rango de fechas,
+    keyword u ocid retornan números de registro, y lineas() lee solo esas líneas del archivo.
+    Si el JSONL está comprimido por bloques, lineas() descomprime solo los bloques que las contienen.
+    """
+
+    def __init__(self, path: str, meta: dict):
+        self.path = path
+        self.meta = meta
+        directorio = ruta_indice(path)
+        cargar = lambda nombre: np.load(os.path.join(directorio, f"{nombre}.npy"), mmap_mode="r")
+        self.offsets = cargar("offsets")
+        self.largos = cargar("largos")
+        self.fechas = cargar("fechas")
+        self.metodos = cargar("metodos")
+        self.compradores = cargar("compradores")
+        self.ocids = cargar("ocids")
+        self.orden_ocids = cargar("orden_ocids")
+        self.postings = cargar("postings")
+        self.postings_inicio = cargar("postings_inicio")
+        with open(os.path.join(directorio, "vocabularios.json"), "r", encoding="utf-8") as f:
+            self.vocabularios = json.load(f)
+        self._archivo = None
+        self._mmap = None
+        self._bloques = None
+
+    @classmethod
+    def abrir(cls, path: str, origen: str | None = None) -> "IndiceRaw | None":
+        """
+        Índice del archivo si existe y corresponde a su contenido actual (tamaño y mtime) y,
+        si se indica, al mismo origen (por ejemplo el sha256 de la publicación); None si no.
+        """
+        try:
+            with open(os.path.join(ruta_indice(path), "meta.json"), "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            huella = _huella(path)
+        except (OSError, ValueError):
+            return None
+        if meta.get("version") != VERSION_INDICE or any(meta.get(k) != v for k, v in huella.items()):
+            return None
+        if origen is not None and meta.get("origen") != origen:
+            return None
+        return cls(path, meta)
+
+    def __len__(self) -> int:
+        return self.meta["registros"]
+
+    def _codigos(self, vocabulario: str, texto: str) -> np.ndarray:
+        texto = texto.lower()
+        return np.array([i for i, v in enumerate(self.vocabularios[vocabulario]) if texto in v.lower()], dtype=np.int32)
+
+    def _registros_termino(self, parte: str) -> np.ndarray:
+        """
+        Registros con alguna palabra que contiene parte (la búsqueda de keywords es por subcadena).
+        """
+        bloques = [
+            self.postings[self.postings_inicio[i]:self.postings_inicio[i + 1]]
+            for i, termino in enumerate(self.vocabularios["terminos"]) if parte in termino
+        ]
+        return np.unique(np.concatenate(bloques)) if bloques else np.empty(0, dtype=np.int32)
+
+    def candidatos(self, keywords: list[str], campos: list[str] | None = None, modo: str = "or") -> np.ndarray | None:
+        """
+        Superconjunto de los registros que FiltroKeywords(keywords, campos, modo) aceptaría, o None
+        si el índice no cubre esos campos. Una keyword con varias palabras exige todas sus partes.
+        """
+        if not campos or not set(campos) <= set(self.meta["campos_texto"]):
+            return None
+        conjuntos = []
+        for keyword in keywords:
+            partes = TOKEN.findall(keyword.lower())
+            if not partes:
+                return None
+            registros = self._registros_termino(partes[0])
+            for parte in partes[1:]:
+                registros = np.intersect1d(registros, self._registros_termino(parte), assume_unique=True)
+            conjuntos.append(registros)
+        resultado = conjuntos[0]
+        for registros in conjuntos[1:]:
+            if modo == "and":
+                resultado = np.intersect1d(resultado, registros, assume_unique=True)
+            else:
+                resultado = np.union1d(resultado, registros)
+        return resultado
+
+    def buscar(self, keywords: list[str] = None, campos: list[str] = None, modo: str = "or",
+               metodo: str = None, comprador: str = None, desde: str = None, hasta: str = None) -> np.ndarray:
+        """
+        Registros que cumplen todos los criterios indicados. metodo y comprador se buscan como
+        subcadena sin distinguir mayúsculas; desde/hasta son fechas 'AAAA-MM-DD' inclusive.
+        Las keywords dan candidatos: confirma con FiltroKeywords sobre lineas().
+        """
+        mascara = np.ones(len(self), dtype=bool)
+        if metodo is not None:
+            mascara &= np.isin(self.metodos, self._codigos("metodos", metodo))
+        if comprador is not None:
+            mascara &= np.isin(self.compradores, self._codigos("compradores", comprador))
+        if desde is not None:
+            mascara &= self.fechas >= _fecha(desde)
+        if hasta is not None:
+            mascara &= (self.fechas > 0) & (self.fechas <= _fecha(hasta))
+        registros = np.flatnonzero(mascara)
+        if keywords:
+            candidatos = self.candidatos(keywords, campos or self.meta["campos_texto"], modo)
+            if candidatos is not None:
+                registros = np.intersect1d(registros, candidatos, assume_unique=True)
+        return registros
+
+    def por_ocid(self, ocid: str) -> np.ndarray:
+        """
+        Registros (releases) con ese ocid, en orden del archivo.
+        """
+        h = np.uint64(_hash_ocid(ocid))
+        inicio = np.searchsorted(self.ocids, h, side="left")
+        fin = np.searchsorted(self.ocids, h, side="right")
+        return np.sort(self.orden_ocids[inicio:fin])
+
+    def lineas(self, registros=None):
+        """
+        Entrega las líneas (bytes, sin salto de línea) de los registros indicados, o de todos, leyéndolas con mmap.
+        """
+        if self._mmap is None:
+            self._archivo = open(self.path, "rb")
+            self._mmap = mmap.mmap(self._archivo.fileno(), 0, access=mmap.ACCESS_READ)
+            if es_comprimido(self.path):
+                self._bloques = leer_bloques(self.path, reconstruir=True)
+                self._inicios_texto = np.concatenate(([0], np.cumsum(self._bloques["bytes_texto"])))
+        if registros is None:
+            registros = range(len(self))
+        actual, texto = -1, b""
+        for i in registros:
+            inicio = int(self.offsets[i])
+            if self._bloques is None:
+                yield self._mmap[inicio:inicio + int(self.largos[i])]
+                continue
+            bloque = int(np.searchsorted(self._inicios_texto, inicio, side="right")) - 1
+            if bloque != actual:
+                offset, largo = self._bloques["offsets"][bloque], self._bloques["largos"][bloque]
+                texto = zlib.decompress(self._mmap[offset:offset + largo], zlib.MAX_WBITS | 16)
+                actual = bloque
+            inicio -= int(self._inicios_texto[bloque])
+            yield texto[inicio:inicio + int(self.largos[i])]
+
+    def cerrar(self):
+        if self._mmap is not None:
+            self._mmap.close()
+            self._archivo.close()
+            self._mmap = self._archivo = None
+
+def muestras_jsonl(path: str, n: int) -> list[dict]:
+    """
+    n registros repartidos de forma uniforme por todo el JSONL, no solo los primeros.
+    Usa el índice si está al día; si no, en un JSONL comprimido descomprime solo los bloques
+    de las muestras, y en uno plano salta a n posiciones de bytes equidistantes y lee la
+    siguiente línea completa desde cada una.
+    """
+    indice = IndiceRaw.abrir(path)
+    if indice is not None:
+        try:
+            if len(indice) == 0:
+                return []
+            registros = np.unique(np.linspace(0, len(indice) - 1, num=min(n, len(indice))).astype(np.int64))
+            return [decodificar(line) for line in indice.lineas(registros)]
+        finally:
+            indice.cerrar()
+
+    if es_comprimido(path):
+        bloques = leer_bloques(path, reconstruir=True)
+        inicios = np.concatenate(([0], np.cumsum(bloques["registros"])))
+        total = int(inicios[-1])
+        registros = sorted({i * total // n for i in range(n)}) if total > n else range(total)
+        records = []
+        actual, lineas = -1, []
+        with open(path, "rb") as f:
+            for registro in registros:
+                bloque = int(np.searchsorted(inicios, registro, side="right")) - 1
+                if bloque != actual:
+                    lineas, actual = leer_bloque(f, bloques, bloque), bloque
+                line = lineas[registro - inicios[bloque]]
+                if line.strip():
+                    records.append(decodificar(line))
+        return records
+
+    size = os.path.getsize(path)
+    with open(path, "rb") as f:
+        if size <= MAX_BYTES_LECTURA_COMPLETA:
+            lineas = [line for line in f if line.strip()]
+            pasos = sorted({i * len(lineas) // n for i in range(n)}) if len(lineas) > n else range(len(lineas))
+            return [decodificar(lineas[i]) for i in pasos]
+        records = []
+        vistos = set()
+        for i in range(n):
+            f.seek(size * i // n)
+            if i:
+                f.readline()
+            inicio = f.tell()
+            line = f.readline()
+            if inicio in vistos or not line.strip():
+                continue
+            vistos.add(inicio)
+            records.append(decodificar(line))
+        return records
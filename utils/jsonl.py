@@ -0,0 +1,364 @@
+import json
+import os
+import shutil
+import zlib
+from utils.serializacion import codificar, decodificar
+
+# Los JSONL intermedios se escriben como bloques gzip independientes de REGISTROS_POR_BLOQUE líneas
+# (el archivo sigue siendo un .gz válido: zcat lo lee). JSONL_COMPRIMIDO=0 vuelve a escribirlos planos.
+COMPRIMIR = os.getenv("JSONL_COMPRIMIDO", "1") != "0"
+REGISTROS_POR_BLOQUE = 4096
+NIVEL_COMPRESION = 1
+CHUNK_LECTURA = 1024 * 1024
+MAGIA_GZIP = b"\x1f\x8b"
+VERSION_BLOQUES = 1
+# Hilos que descomprimen bloques por adelantado en las lecturas secuenciales de las etapas
+LECTORES = min(4, os.cpu_count() or 1)
+
+def ruta_meta(path: str) -> str:
+    """
+    Ruta del archivo de metadatos que acompaña a un JSONL: data/normalized/ecuador.jsonl -> ecuador.meta.json
+    """
+    base = path[:-len(".jsonl")] if path.endswith(".jsonl") else path
+    return f"{base}.meta.json"
+
+def ruta_bloques(path: str) -> str:
+    """
+    Índice de bloques de un JSONL comprimido: data/normalized/ecuador.jsonl -> ecuador.bloques.json
+    """
+    base = path[:-len(".jsonl")] if path.endswith(".jsonl") else path
+    return f"{base}.bloques.json"
+
+def escribir_json_atomico(path: str, data):
+    """
+    Escribe un JSON en un archivo temporal y lo renombra: un corte a mitad de escritura
+    nunca deja un archivo a medias.
+    """
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+def escribir_meta(path: str, meta: dict):
+    """
+    Guarda de forma atómica los metadatos del JSONL indicado.
+    """
+    escribir_json_atomico(ruta_meta(path), meta)
+
+def leer_meta(path: str) -> dict:
+    """
+    Lee los metadatos del JSONL indicado; retorna {} si no existen.
+    """
+    meta_path = ruta_meta(path)
+    if not os.path.exists(meta_path):
+        return {}
+    with open(meta_path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def es_comprimido(path: str) -> bool:
+    with open(path, "rb") as f:
+        return f.read(2) == MAGIA_GZIP
+
+def _huella(path: str) -> dict:
+    stat = os.stat(path)
+    return {"bytes": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+class EscritorJsonl:
+    """
+    Escribe un JSONL línea a línea. Comprimido, agrupa REGISTROS_POR_BLOQUE líneas en un miembro gzip
+    independiente y al cerrar guarda junto al archivo el índice de bloques (offset y tamaño comprimido,
+    registros y bytes sin comprimir de cada uno), que permite leer o repartir bloques sin descomprimir
+    los anteriores. Con anexar=True continúa un archivo existente en el formato que ya tenga.
+    Quita el archivo anterior antes de escribir (puede ser un hardlink a la cache de descargas).
+    """
+
+    def __init__(self, path: str, comprimir: bool | None = None, anexar: bool = False,
+                 registros_por_bloque: int = REGISTROS_POR_BLOQUE, nivel: int = NIVEL_COMPRESION):
+        self.path = path
+        self.comprimir = COMPRIMIR if comprimir is None else comprimir
+        self.registros_por_bloque = registros_por_bloque
+        self.nivel = nivel
+        self.registros = 0
+        self.bloques = {"offsets": [], "largos": [], "registros": [], "bytes_texto": []}
+        self._pendientes = []
+        existe = anexar and os.path.exists(path) and os.path.getsize(path) > 0
+        if existe:
+            self.comprimir = es_comprimido(path)
+            anteriores = leer_bloques(path) if self.comprimir else None
+            if anteriores is not None:
+                self.bloques = {k: anteriores[k] for k in self.bloques}
+            else:
+                self.bloques = None
+        elif os.path.lexists(path):
+            os.unlink(path)
+        if os.path.exists(ruta_bloques(path)) and not (existe and self.bloques):
+            os.unlink(ruta_bloques(path))
+        self._f = open(path, "ab" if existe else "wb", buffering=CHUNK_LECTURA)
+
+    def escribir_linea(self, line: bytes):
+        """
+        Escribe una línea ya serializada, sin el salto de línea.
+        """
+        self.registros += 1
+        if not self.comprimir:
+            self._f.write(line)
+            self._f.write(b"\n")
+            return
+        self._pendientes.append(line)
+        if len(self._pendientes) >= self.registros_por_bloque:
+            self._vaciar()
+
+    def escribir(self, record: dict):
+        self.escribir_linea(codificar(record))
+
+    def _vaciar(self):
+        if not self._pendientes:
+            return
+        texto = b"\n".join(self._pendientes) + b"\n"
+        compresor = zlib.compressobj(self.nivel, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+        miembro = compresor.compress(texto) + compresor.flush()
+        if self.bloques is not None:
+            self.bloques["offsets"].append(self._f.tell())
+            self.bloques["largos"].append(len(miembro))
+            self.bloques["registros"].append(len(self._pendientes))
+            self.bloques["bytes_texto"].append(len(texto))
+        self._f.write(miembro)
+        self._pendientes = []
+
+    def cerrar(self):
+        if self._f.closed:
+            return
+        if self.comprimir:
+            self._vaciar()
+        self._f.close()
+        if self.comprimir and self.bloques is not None:
+            escribir_json_atomico(ruta_bloques(self.path), {
+                "version": VERSION_BLOQUES, **_huella(self.path), **self.bloques
+            })
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.cerrar()
+
+def lineas_gzip(chunks):
+    """
+    Descomprime en streaming bloques gzip (admite varios miembros concatenados)
+    y entrega cada línea en bytes, sin el salto de línea.
+    zlib verifica el CRC de cada miembro; un archivo cortado a mitad de un miembro lanza un error.
+    """
+    decomp = zlib.decompressobj(zlib.MAX_WBITS | 32)
+    miembro_abierto = False
+    resto = b""
+    for chunk in chunks:
+        while chunk:
+            miembro_abierto = True
+            data = decomp.decompress(chunk)
+            chunk = b""
+            if decomp.eof:
+                chunk = decomp.unused_data
+                decomp = zlib.decompressobj(zlib.MAX_WBITS | 32)
+                miembro_abierto = False
+            if data:
+                lineas = (resto + data).split(b"\n")
+                resto = lineas.pop()
+                yield from lineas
+    if miembro_abierto:
+        raise zlib.error("Archivo gzip incompleto: el último miembro está cortado")
+    if resto:
+        yield resto
+
+def _reconstruir_bloques(path: str) -> dict:
+    """
+    Recorre los miembros gzip del archivo para rehacer su índice de bloques (por ejemplo, si el
+    archivo viene de la cache de descargas o se anexó sin índice).
+    """
+    bloques = {"offsets": [], "largos": [], "registros": [], "bytes_texto": []}
+    offset = 0
+    decomp = zlib.decompressobj(zlib.MAX_WBITS | 32)
+    inicio, lineas, texto = 0, 0, 0
+    with open(path, "rb") as f:
+        while chunk := f.read(CHUNK_LECTURA):
+            while chunk:
+                data = decomp.decompress(chunk)
+                lineas += data.count(b"\n")
+                texto += len(data)
+                if not decomp.eof:
+                    offset += len(chunk)
+                    break
+                fin = offset + len(chunk) - len(decomp.unused_data)
+                for clave, valor in zip(bloques, (inicio, fin - inicio, lineas, texto)):
+                    bloques[clave].append(valor)
+                chunk = decomp.unused_data
+                offset = inicio = fin
+                lineas, texto = 0, 0
+                decomp = zlib.decompressobj(zlib.MAX_WBITS | 32)
+    if offset != inicio:
+        raise zlib.error(f"Archivo gzip incompleto: {path}")
+    return bloques
+
+def leer_bloques(path: str, reconstruir: bool = False) -> dict | None:
+    """
+    Índice de bloques del JSONL comprimido si corresponde al archivo actual (tamaño y mtime).
+    Si no existe o quedó viejo retorna None, o lo rehace y lo guarda con reconstruir=True.
+    """
+    try:
+        with open(ruta_bloques(path), "r", encoding="utf-8") as f:
+            bloques = json.load(f)
+        if bloques.get("version") == VERSION_BLOQUES and all(bloques.get(k) == v for k, v in _huella(path).items()):
+            return bloques
+    except (OSError, ValueError):
+        pass
+    if not reconstruir:
+        return None
+    bloques = {"version": VERSION_BLOQUES, **_huella(path), **_reconstruir_bloques(path)}
+    escribir_json_atomico(ruta_bloques(path), bloques)
+    return bloques
+
+def leer_bloque(f, bloques: dict, i: int) -> list[bytes]:
+    """
+    Líneas (sin salto de línea) del bloque i de un archivo comprimido abierto en binario.
+    """
+    f.seek(bloques["offsets"][i])
+    texto = zlib.decompress(f.read(bloques["largos"][i]), zlib.MAX_WBITS | 16)
+    return texto.split(b"\n")[:-1]
+
+def particionar(path: str, num: int) -> list[tuple[int, int]]:
+    """
+    Divide el archivo en hasta num rangos [inicio, fin) para procesarlos en paralelo:
+    rangos de bytes que empiezan y terminan en un salto de línea si es plano, rangos de
+    bloques (repartidos por tamaño comprimido) si está comprimido.
+    """
+    size = os.path.getsize(path)
+    if size == 0:
+        return []
+    if es_comprimido(path):
+        largos = leer_bloques(path, reconstruir=True)["largos"]
+        bordes = [0]
+        acumulado = 0
+        for i, largo in enumerate(largos[:-1]):
+            acumulado += largo
+            if acumulado * num >= size * len(bordes):
+                bordes.append(i + 1)
+        bordes.append(len(largos))
+        return list(zip(bordes[:-1], bordes[1:]))
+    bordes = [0]
+    with open(path, "rb") as f:
+        for i in range(1, num):
+            f.seek(max(size * i // num, bordes[-1]))
+            f.readline()
+            pos = f.tell()
+            if pos >= size:
+                break
+            if pos > bordes[-1]:
+                bordes.append(pos)
+    bordes.append(size)
+    return list(zip(bordes[:-1], bordes[1:]))
+
+def leer_rango(path: str, inicio: int, fin: int):
+    """
+    Entrega (líneas, bytes avanzados) del rango [inicio, fin) de particionar(): grupos de líneas
+    de ~1 MB en un archivo plano, o un bloque descomprimido a la vez en uno comprimido. Los bytes
+    avanzados son del archivo en disco, para las barras de progreso.
+    """
+    with open(path, "rb") as f:
+        if es_comprimido(path):
+            bloques = leer_bloques(path, reconstruir=True)
+            for i in range(inicio, fin):
+                yield leer_bloque(f, bloques, i), bloques["largos"][i]
+            return
+        f.seek(inicio)
+        pos = inicio
+        lineas, avance = [], 0
+        while pos < fin:
+            line = f.readline()
+            if not line:
+                break
+            pos += len(line)
+            avance += len(line)
+            lineas.append(line.rstrip(b"\n"))
+            if avance >= CHUNK_LECTURA:
+                yield lineas, avance
+                lineas, avance = [], 0
+        if lineas:
+            yield lineas, avance
+
+def iterar_lineas(path: str, workers: int = 1):
+    """
+    Lee un JSONL plano o comprimido línea a línea (bytes, sin salto de línea).
+    Con workers > 1 y el índice de bloques al día, descomprime varios bloques en paralelo
+    (zlib libera el GIL) manteniendo el orden.
+    """
+    if not es_comprimido(path):
+        with open(path, "rb", buffering=CHUNK_LECTURA) as f:
+            for line in f:
+                yield line.rstrip(b"\n")
+        return
+    bloques = leer_bloques(path) if workers > 1 else None
+    if bloques is None:
+        with open(path, "rb") as f:
+            yield from lineas_gzip(iter(lambda: f.read(CHUNK_LECTURA), b""))
+        return
+    from utils.cliente_http import descargar_en_orden
+
+    def comprimidos(f):
+        for offset, largo in zip(bloques["offsets"], bloques["largos"]):
+            f.seek(offset)
+            yield f.read(largo)
+
+    def descomprimir(data: bytes) -> list[bytes]:
+        return zlib.decompress(data, zlib.MAX_WBITS | 16).split(b"\n")[:-1]
+
+    with open(path, "rb") as f:
+        for _, lineas in descargar_en_orden(descomprimir, comprimidos(f), workers):
+            yield from lineas
+
+def concatenar(partes: list[str], destino: str):
+    """
+    Une en orden JSONL escritos con el mismo formato copiando sus bytes: los miembros gzip
+    concatenados siguen siendo válidos, y sus índices de bloques se unen desplazando los offsets.
+    """
+    for path in (destino, ruta_bloques(destino)):
+        if os.path.lexists(path):
+            os.unlink(path)
+    bloques = {"offsets": [], "largos": [], "registros": [], "bytes_texto": []}
+    comprimido = False
+    offset = 0
+    with open(destino, "wb") as f_out:
+        for parte in partes:
+            size = os.path.getsize(parte)
+            if size == 0:
+                continue
+            if es_comprimido(parte):
+                comprimido = True
+                anteriores = leer_bloques(parte, reconstruir=True)
+                bloques["offsets"].extend(o + offset for o in anteriores["offsets"])
+                for clave in ("largos", "registros", "bytes_texto"):
+                    bloques[clave].extend(anteriores[clave])
+            with open(parte, "rb") as f_parte:
+                shutil.copyfileobj(f_parte, f_out, 4 * CHUNK_LECTURA)
+            offset += size
+    if comprimido:
+        escribir_json_atomico(ruta_bloques(destino), {"version": VERSION_BLOQUES, **_huella(destino), **bloques})
+
+def iterar_jsonl(path: str, workers: int = 1):
+    """
+    Lee un JSONL (plano o comprimido por bloques) registro a registro sin cargarlo entero en memoria.
+    """
+    for line in iterar_lineas(path, workers=workers):
+        if line.strip():
+            yield decodificar(line)
+
+def iterar_lotes(registros, batch_size: int):
+    """
+    Agrupa un iterable de registros en listas de hasta batch_size elementos.
+    """
+    lote = []
+    for registro in registros:
+        lote.append(registro)
+        if len(lote) >= batch_size:
+            yield lote
+            lote = []
+    if lote:
+        yield lote
@@ -0,0 +1,334 @@
+import asyncio
+import contextvars
+import dataclasses
+import heapq
+import itertools
+import json
+import math
+import os
+import random
+import statistics
+import time
+from collections import deque
+from agents import Model, ModelProvider, RunConfig, Runner
+from agents.models.multi_provider import MultiProvider
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+
+PRIORIDAD_ALTA = 0
+PRIORIDAD_NORMAL = 5
+PRIORIDAD_BAJA = 10
+
+LIMITES_PATH = "config/limites_llm.json"
+# Límites por minuto con los que arranca cada modelo. Con la primera respuesta del proveedor se
+# reemplazan por los de la cuenta (cabeceras x-ratelimit-limit-*); config/limites_llm.json
+# ({"modelo": {"rpm": ..., "tpm": ...}}) los cambia desde el inicio.
+LIMITES_POR_MODELO = {
+    "gpt-4o": {"rpm": 500, "tpm": 30_000},
+    "o3-mini": {"rpm": 1_000, "tpm": 100_000},
+}
+LIMITE_POR_DEFECTO = {"rpm": 500, "tpm": 30_000}
+TOKENS_SALIDA_ESTIMADOS = 500
+ESTADOS_REINTENTABLES = {429, 500, 502, 503, 504}
+
+# Modelo de la llamada en curso en esta tarea, para atribuirle las cabeceras de la respuesta HTTP
+_modelo_en_curso = contextvars.ContextVar("modelo_en_curso", default=None)
+
+def _cargar_limites(path: str = LIMITES_PATH):
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            LIMITES_POR_MODELO.update(json.load(f))
+
+_cargar_limites()
+
+def estimar_tokens(texto: str) -> int:
+    """
+    Estimación local de tokens (~3.5 caracteres por token en español), sin llamar al tokenizer del modelo.
+    """
+    return math.ceil(len(texto) / 3.5)
+
+def _estado_http(error: Exception):
+    """
+    Código HTTP de un error del proveedor (openai.APIStatusError y similares), o None.
+    """
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    return status
+
+def _retry_after(error: Exception):
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+def _es_reintentable(error: Exception) -> bool:
+    if _estado_http(error) in ESTADOS_REINTENTABLES:
+        return True
+    nombre = type(error).__name__
+    return "RateLimit" in nombre or "Timeout" in nombre or "Connection" in nombre
+
+class _Cubeta:
+    """
+    Token bucket con capacidad de un minuto que se rellena de forma continua.
+    """
+
+    def __init__(self, por_minuto: float):
+        self.capacidad = float(por_minuto)
+        self.disponible = float(por_minuto)
+        self.actualizado = time.monotonic()
+
+    def _rellenar(self):
+        ahora = time.monotonic()
+        self.disponible = min(self.capacidad, self.disponible + (ahora - self.actualizado) * self.capacidad / 60)
+        self.actualizado = ahora
+
+    def espera(self, cantidad: float) -> float:
+        self._rellenar()
+        cantidad = min(cantidad, self.capacidad)
+        if self.disponible >= cantidad:
+            return 0.0
+        return (cantidad - self.disponible) * 60 / self.capacidad
+
+    def consumir(self, cantidad: float):
+        self._rellenar()
+        self.disponible -= min(cantidad, self.capacidad)
+
+    def ajustar(self, por_minuto: float):
+        """
+        Cambia la capacidad conservando lo ya consumido en el último minuto.
+        """
+        self._rellenar()
+        self.disponible = min(float(por_minuto), self.disponible + por_minuto - self.capacidad)
+        self.capacidad = float(por_minuto)
+
+    def vaciar(self):
+        self._rellenar()
+        self.disponible = min(self.disponible, 0.0)
+
+class _ModeloPlanificado(Model):
+    """
+    Model del SDK que pasa cada llamada al modelo por el planificador. Un Runner.run de un
+    agente con tools hace varias llamadas; cada una paga su presupuesto y se reintenta sola.
+    """
+
+    def __init__(self, planificador: "PlanificadorLLM", modelo: Model, nombre: str, prioridad: int):
+        self.planificador = planificador
+        self.modelo = modelo
+        self.nombre = nombre
+        self.prioridad = prioridad
+
+    def _tokens(self, system_instructions, input) -> int:
+        texto = (system_instructions or "") + (input if isinstance(input, str) else str(input))
+        return estimar_tokens(texto) + TOKENS_SALIDA_ESTIMADOS
+
+    async def get_response(self, system_instructions, input, *args, **kwargs):
+        return await self.planificador.llamar(
+            self.nombre, self._tokens(system_instructions, input), self.prioridad,
+            lambda: self.modelo.get_response(system_instructions, input, *args, **kwargs),
+        )
+
+    async def stream_response(self, system_instructions, input, *args, **kwargs):
+        # Sin reintentos: los eventos ya entregados no se pueden retirar
+        await self.planificador._adquirir(self.nombre, self._tokens(system_instructions, input), self.prioridad)
+        try:
+            async for evento in self.modelo.stream_response(system_instructions, input, *args, **kwargs):
+                yield evento
+        finally:
+            self.planificador._liberar()
+
+class _ProveedorPlanificado(ModelProvider):
+    def __init__(self, planificador: "PlanificadorLLM", prioridad: int):
+        self.planificador = planificador
+        self.prioridad = prioridad
+
+    def get_model(self, model_name: str | None) -> Model:
+        modelo = self.planificador.proveedor_modelos().get_model(model_name)
+        return _ModeloPlanificado(self.planificador, modelo, model_name or "default", self.prioridad)
+
+class PlanificadorLLM:
+    """
+    Planificador único del proceso para todas las llamadas a los modelos:
+    - concurrencia global acotada (max_concurrencia llamadas en curso),
+    - presupuestos de requests y tokens por minuto para cada modelo, con los límites
+      que informa el proveedor en cada respuesta,
+    - cola por prioridad (PRIORIDAD_ALTA antes que PRIORIDAD_BAJA, FIFO dentro de la misma),
+    - reintentos con backoff exponencial con jitter ante 429 y 5xx.
+    Actúa sobre cada llamada al modelo, no sobre Runner.run completo: un reintento nunca vuelve
+    a ejecutar las tools que el agente ya corrió, y un agente con tools no ocupa un lugar de
+    concurrencia mientras esperan sus llamadas anidadas.
+    """
+
+    def __init__(self, max_concurrencia: int = 16, reintentos: int = 5,
+                 espera_base: float = 1.0, espera_max: float = 60.0):
+        self.max_concurrencia = max_concurrencia
+        self.reintentos = reintentos
+        self.espera_base = espera_base
+        self.espera_max = espera_max
+        self._cola = []
+        self._secuencia = itertools.count()
+        self._en_curso = 0
+        self._cubetas = {}
+        self._proveedor = None
+        self._despertador = None
+        self._latencias = deque(maxlen=1000)
+        self._esperas = deque(maxlen=1000)
+        self._contadores = {"completadas": 0, "errores": 0, "reintentos": 0}
+
+    def configurar_modelo(self, modelo: str, rpm: float, tpm: float):
+        LIMITES_POR_MODELO[modelo] = {"rpm": rpm, "tpm": tpm}
+        if modelo in self._cubetas:
+            requests_min, tokens_min = self._cubetas[modelo]
+            requests_min.ajustar(rpm)
+            tokens_min.ajustar(tpm)
+
+    def proveedor_modelos(self) -> ModelProvider:
+        """
+        Proveedor de los modelos reales. El cliente no reintenta por su cuenta (lo hace el
+        planificador) y lee los límites de la cuenta de las cabeceras de cada respuesta.
+        """
+        if self._proveedor is None:
+            cliente = AsyncOpenAI(
+                max_retries=0,
+                http_client=DefaultAsyncHttpxClient(event_hooks={"response": [self._leer_limites]}),
+            )
+            self._proveedor = MultiProvider(openai_client=cliente)
+        return self._proveedor
+
+    async def _leer_limites(self, response):
+        modelo = _modelo_en_curso.get()
+        try:
+            rpm = float(response.headers["x-ratelimit-limit-requests"])
+            tpm = float(response.headers["x-ratelimit-limit-tokens"])
+        except (KeyError, ValueError):
+            return
+        if modelo is not None and LIMITES_POR_MODELO.get(modelo) != {"rpm": rpm, "tpm": tpm}:
+            print(f"[planificador] {modelo}: límites de la cuenta {rpm:,.0f} rpm, {tpm:,.0f} tpm")
+            self.configurar_modelo(modelo, rpm, tpm)
+
+    def _cubetas_de(self, modelo: str):
+        if modelo not in self._cubetas:
+            limites = LIMITES_POR_MODELO.get(modelo, LIMITE_POR_DEFECTO)
+            self._cubetas[modelo] = (_Cubeta(limites["rpm"]), _Cubeta(limites["tpm"]))
+        return self._cubetas[modelo]
+
+    def _despachar(self):
+        """
+        Libera, en orden de prioridad, las peticiones que caben en la concurrencia y en los
+        presupuestos de su modelo. Si alguna debe esperar a que se rellenen las cubetas,
+        programa un nuevo despacho para ese momento.
+        """
+        self._despertador = None
+        bloqueados = set()
+        saltados = []
+        proxima_espera = None
+        while self._cola:
+            prioridad, seq, modelo, tokens, futuro = heapq.heappop(self._cola)
+            if futuro.done():
+                continue
+            if modelo in bloqueados or self._en_curso >= self.max_concurrencia:
+                saltados.append((prioridad, seq, modelo, tokens, futuro))
+                continue
+            requests_min, tokens_min = self._cubetas_de(modelo)
+            espera = max(requests_min.espera(1), tokens_min.espera(tokens))
+            if espera > 0:
+                bloqueados.add(modelo)
+                proxima_espera = espera if proxima_espera is None else min(proxima_espera, espera)
+                saltados.append((prioridad, seq, modelo, tokens, futuro))
+                continue
+            requests_min.consumir(1)
+            tokens_min.consumir(tokens)
+            self._en_curso += 1
+            futuro.set_result(None)
+        for item in saltados:
+            heapq.heappush(self._cola, item)
+        if proxima_espera is not None:
+            self._despertador = asyncio.get_running_loop().call_later(proxima_espera, self._despachar)
+
+    def _programar(self):
+        if self._despertador is not None:
+            self._despertador.cancel()
+        self._despachar()
+
+    async def _adquirir(self, modelo: str, tokens: int, prioridad: int):
+        futuro = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._cola, (prioridad, next(self._secuencia), modelo, tokens, futuro))
+        self._programar()
+        try:
+            await futuro
+        except asyncio.CancelledError:
+            if futuro.done() and not futuro.cancelled():
+                self._liberar()
+            raise
+
+    def _liberar(self):
+        self._en_curso -= 1
+        self._programar()
+
+    async def llamar(self, modelo: str, tokens: int, prioridad: int, llamada):
+        """
+        Ejecuta llamada() (una sola petición al modelo, sin efectos fuera de ella) dentro de la
+        concurrencia y los presupuestos del modelo, reintentándola ante errores transitorios.
+        """
+        encolado = time.monotonic()
+        intento = 0
+        while True:
+            await self._adquirir(modelo, tokens, prioridad)
+            inicio = time.monotonic()
+            self._esperas.append(inicio - encolado)
+            token = _modelo_en_curso.set(modelo)
+            try:
+                result = await llamada()
+                self._latencias.append(time.monotonic() - inicio)
+                self._contadores["completadas"] += 1
+                return result
+            except Exception as e:
+                if not _es_reintentable(e) or intento >= self.reintentos:
+                    self._contadores["errores"] += 1
+                    raise
+                intento += 1
+                self._contadores["reintentos"] += 1
+                espera = _retry_after(e)
+                if espera is None:
+                    espera = min(self.espera_max, self.espera_base * 2 ** intento) * random.uniform(0.5, 1.5)
+                if _estado_http(e) == 429:
+                    # El proveedor dice que no queda cupo: se frena a todas las peticiones del modelo
+                    for cubeta in self._cubetas_de(modelo):
+                        cubeta.vaciar()
+                print(f"[planificador] {modelo}: {type(e).__name__}, reintento {intento}/{self.reintentos} en {espera:.1f}s")
+            finally:
+                _modelo_en_curso.reset(token)
+                self._liberar()
+            await asyncio.sleep(espera)
+            encolado = time.monotonic()
+
+    async def ejecutar(self, agent, input, prioridad: int = PRIORIDAD_NORMAL, **kwargs):
+        """
+        Runner.run(agent, input) con todas sus llamadas al modelo, incluidas las de agentes
+        con tools, pasando por el planificador con la prioridad indicada.
+        """
+        run_config = kwargs.pop("run_config", None) or RunConfig()
+        run_config = dataclasses.replace(run_config, model_provider=_ProveedorPlanificado(self, prioridad))
+        return await Runner.run(agent, input=input, run_config=run_config, **kwargs)
+
+    def estadisticas(self) -> dict:
+        """
+        Profundidad de la cola, llamadas en curso, contadores y latencias (segundos).
+        """
+        latencias = sorted(self._latencias)
+        return {
+            "en_cola": sum(1 for *_, futuro in self._cola if not futuro.done()),
+            "en_curso": self._en_curso,
+            **self._contadores,
+            "latencia_p50": statistics.median(latencias) if latencias else None,
+            "latencia_p95": latencias[int(len(latencias) * 0.95)] if latencias else None,
+            "espera_cola_media": statistics.fmean(self._esperas) if self._esperas else None,
+        }
+
+planificador = PlanificadorLLM()
+
+async def ejecutar_agente(agent, input, prioridad: int = PRIORIDAD_NORMAL, **kwargs):
+    """
+    Punto único para ejecutar agentes: usa el planificador compartido del proceso.
+    """
+    return await planificador.ejecutar(agent, input, prioridad=prioridad, **kwargs)
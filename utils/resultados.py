@@ -0,0 +1,82 @@
+import json
+import os
+import sqlite3
+import time
+
+RESULTADOS_PATH = "data/analiced/resultados.sqlite"
+
+class AlmacenResultados:
+    """
+    Resultados del análisis por país en SQLite (modo WAL), en lugar de reescribir un JSON compartido.
+    Cada país se guarda con un upsert en una sola transacción, así que varios análisis en
+    paralelo (hilos o procesos) no se pisan. Junto a los totales se guardan los metadatos
+    de la ejecución: año, búsqueda, conteos de registros y tasas usadas.
+    """
+
+    def __init__(self, path: str = RESULTADOS_PATH):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self.conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS totales ("
+            "pais TEXT NOT NULL, categoria TEXT NOT NULL, presupuesto_usd REAL NOT NULL, "
+            "valor_adj_usd REAL NOT NULL, registros INTEGER NOT NULL, PRIMARY KEY (pais, categoria))"
+        )
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS ejecuciones ("
+            "pais TEXT PRIMARY KEY, anio INTEGER, busqueda TEXT, registros_normalizados INTEGER, "
+            "registros_clasificados INTEGER, tasas TEXT NOT NULL, actualizado REAL NOT NULL)"
+        )
+
+    def guardar(self, pais: str, totales: dict, anio: int | None = None, busqueda: str | None = None,
+                registros_normalizados: int | None = None, registros_clasificados: int | None = None,
+                tasas: dict | None = None):
+        """
+        Reemplaza los resultados del país. totales es la salida de agregacion.agregar.
+        """
+        pais = pais.lower()
+        filas = [
+            (pais, categoria, presupuesto, totales["valor_adj"].get(categoria, 0.0), totales["registros"].get(categoria, 0))
+            for categoria, presupuesto in totales["presupuesto"].items()
+        ]
+        with self.conn:
+            self.conn.execute("BEGIN IMMEDIATE")
+            self.conn.execute("DELETE FROM totales WHERE pais = ?", (pais,))
+            self.conn.executemany(
+                "INSERT INTO totales (pais, categoria, presupuesto_usd, valor_adj_usd, registros) VALUES (?, ?, ?, ?, ?)",
+                filas
+            )
+            self.conn.execute(
+                "INSERT OR REPLACE INTO ejecuciones (pais, anio, busqueda, registros_normalizados, "
+                "registros_clasificados, tasas, actualizado) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (pais, anio, busqueda, registros_normalizados, registros_clasificados,
+                 json.dumps(tasas or {}, ensure_ascii=False), time.time())
+            )
+
+    def totales(self, campo: str = "presupuesto_usd") -> dict[str, dict[str, float]]:
+        """
+        {pais: {categoria: monto}} con campo presupuesto_usd, valor_adj_usd o registros.
+        """
+        if campo not in ("presupuesto_usd", "valor_adj_usd", "registros"):
+            raise ValueError(f"Campo desconocido: {campo}")
+        resultado = {}
+        for pais, categoria, valor in self.conn.execute(f"SELECT pais, categoria, {campo} FROM totales ORDER BY pais"):
+            resultado.setdefault(pais, {})[categoria] = valor
+        return resultado
+
+    def ejecuciones(self) -> dict[str, dict]:
+        """
+        Metadatos de la última ejecución de cada país.
+        """
+        columnas = ("anio", "busqueda", "registros_normalizados", "registros_clasificados", "tasas", "actualizado")
+        resultado = {}
+        for pais, *valores in self.conn.execute(f"SELECT pais, {', '.join(columnas)} FROM ejecuciones ORDER BY pais"):
+            meta = dict(zip(columnas, valores))
+            meta["tasas"] = json.loads(meta["tasas"])
+            resultado[pais] = meta
+        return resultado
+
+    def cerrar(self):
+        self.conn.close()
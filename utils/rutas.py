@@ -0,0 +1,37 @@
+"""
+Rutas tipo 'tender.items[0].description' sobre registros JSON. El filtro por keywords, el índice
+de los raw y el mapping del normalizador separan y recorren las rutas con estas funciones, así
+el índice extrae exactamente el mismo texto que el filtro y sus candidatos siempre lo contienen.
+"""
+import json
+import re
+
+def partes_ruta(path: str) -> list:
+    """
+    Convierte 'tender.items[0].description' en ['tender', 'items', 0, 'description'].
+    """
+    partes = [p for p in re.split(r'\.|\[|\]', path) if p != '']
+    return [int(p) if p.isdigit() else p for p in partes]
+
+def valores_ruta(obj, partes: list):
+    """
+    Entrega los valores de una ruta como texto; si encuentra una lista sin índice recorre todos sus elementos.
+    """
+    if not partes:
+        if isinstance(obj, list):
+            for item in obj:
+                yield from valores_ruta(item, partes)
+        elif isinstance(obj, dict):
+            yield json.dumps(obj, ensure_ascii=False)
+        elif obj is not None:
+            yield str(obj)
+        return
+    parte = partes[0]
+    if isinstance(parte, int):
+        if isinstance(obj, list) and -len(obj) <= parte < len(obj):
+            yield from valores_ruta(obj[parte], partes[1:])
+    elif isinstance(obj, dict):
+        yield from valores_ruta(obj.get(parte), partes[1:])
+    elif isinstance(obj, list):
+        for item in obj:
+            yield from valores_ruta(item, partes)
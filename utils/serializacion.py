@@ -0,0 +1,98 @@
+"""
+Codificación de registros JSONL, una línea por registro. Usa orjson si está instalado y json
+de la biblioteca estándar si no; las dos implementaciones producen los mismos bytes:
+JSON compacto (sin espacios tras ',' y ':'), UTF-8 sin escapar y NaN/Infinity como null.
+Los tipos que solo orjson sabe escribir (fechas, dataclasses, subclases) se delegan a json,
+que los rechaza igual que siempre; UUID y Enum se escriben como los escribe orjson.
+"""
+import enum
+import json
+import math
+import uuid
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+BACKEND = "orjson" if orjson is not None else "json"
+# Fechas, dataclasses y subclases de str/int/dict/list no se escriben con orjson: van al camino de json
+_OPCIONES_ORJSON = (
+    orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS | orjson.OPT_PASSTHROUGH_SUBCLASS
+    if orjson is not None else 0
+)
+# Los chequeos buscan subcadenas con todos los dígitos llevados a 0 (translate y "in" corren
+# en C; una regex por registro se comía la ganancia). Pueden coincidir dentro de textos:
+# en ese caso solo se toma el camino de json, que da el mismo resultado.
+_DIGITOS_A_CERO = bytes.maketrans(b"123456789", b"000000000")
+# Enteros de más de 64 bits: orjson los lee como float
+_ENTERO_GRANDE = b"0" * 20
+
+def _float_distinto(data: bytes) -> bool:
+    """
+    Floats que orjson escribe distinto que json: con exponente (1e16, 1.5e-6 en vez de 1e+16,
+    1.5e-06) o menores que 1e-4 sin exponente (0.00001 en vez de 1e-05).
+    """
+    return b"0.0000" in data or b"0e" in data.translate(_DIGITOS_A_CERO)
+
+def _sin_no_finitos(obj):
+    if isinstance(obj, float) and not math.isfinite(obj):
+        return None
+    if isinstance(obj, dict):
+        return {k: _sin_no_finitos(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [_sin_no_finitos(v) for v in obj]
+    return obj
+
+def _tipos_orjson(obj):
+    # orjson escribe UUID y Enum de forma nativa; json los escribe igual en vez de fallar
+    if isinstance(obj, uuid.UUID):
+        return str(obj)
+    if isinstance(obj, enum.Enum):
+        return obj.value
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+def codificar_json(obj) -> bytes:
+    """
+    Codificación de referencia con la biblioteca estándar.
+    """
+    try:
+        texto = json.dumps(obj, ensure_ascii=False, separators=(",", ":"), allow_nan=False, default=_tipos_orjson)
+    except ValueError:
+        # NaN e Infinity no son JSON válido: se escriben como null, igual que orjson
+        texto = json.dumps(_sin_no_finitos(obj), ensure_ascii=False, separators=(",", ":"), default=_tipos_orjson)
+    return texto.encode("utf-8")
+
+def decodificar_json(data: bytes | str):
+    return json.loads(data)
+
+def codificar(obj) -> bytes:
+    """
+    Un registro como línea JSON en bytes, sin salto de línea.
+    """
+    if orjson is None:
+        return codificar_json(obj)
+    try:
+        data = orjson.dumps(obj, option=_OPCIONES_ORJSON)
+    except TypeError:
+        # Claves que no son str, enteros de más de 64 bits, surrogates, tipos delegados...: json decide
+        return codificar_json(obj)
+    if _float_distinto(data):
+        return codificar_json(obj)
+    return data
+
+def decodificar(data: bytes | str):
+    """
+    Un registro desde una línea JSON (bytes o str).
+    """
+    if orjson is None:
+        return json.loads(data)
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    if _ENTERO_GRANDE in data.translate(_DIGITOS_A_CERO):
+        return json.loads(data)
+    try:
+        return orjson.loads(data)
+    except orjson.JSONDecodeError:
+        # NaN, Infinity o escapes de surrogates sueltos: json los acepta
+        return json.loads(data)
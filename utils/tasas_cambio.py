@@ -0,0 +1,134 @@
+import asyncio
+import datetime
+import json
+import os
+import sqlite3
+import time
+
+TABLA_PATH = "config/tasas_cambio.json"
+
+class ErrorTasaCambio(Exception):
+    """
+    No se pudo obtener una tasa confiable para la moneda; nunca se asume 1.0.
+    """
+
+def _validar(moneda: str, tasa) -> float:
+    try:
+        tasa = float(tasa)
+    except (TypeError, ValueError):
+        raise ErrorTasaCambio(f"Tasa inválida para {moneda}: {tasa!r}")
+    if not tasa > 0:
+        raise ErrorTasaCambio(f"Tasa inválida para {moneda}: {tasa!r}")
+    return tasa
+
+class ProveedorTasas:
+    """
+    Tasas de cambio a USD con tres niveles:
+    - memo en proceso por (moneda, fecha), con un lock por clave para que las consultas
+      concurrentes de la misma moneda hagan una sola búsqueda,
+    - cache persistente en SQLite (modo WAL) por (moneda, fecha); las tasas del día vencen
+      a las ttl_horas, las de fechas pasadas no cambian,
+    - consultar(moneda, fecha), normalmente el agente de monedas, solo cuando la cache no tiene la tasa.
+    Si la consulta falla se usa la tasa guardada más cercana a la fecha aunque esté vencida, y si
+    la cache no tiene ninguna de esa moneda, la tabla estática (config/tasas_cambio.json).
+    En modo offline la tabla va primero. Si no hay ninguna, se lanza ErrorTasaCambio.
+    """
+
+    def __init__(self, consultar=None, path: str = "data/cache/tasas.sqlite", ttl_horas: float = 24,
+                 tabla_path: str = TABLA_PATH, offline: bool | None = None):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.consultar = consultar
+        self.ttl_segundos = ttl_horas * 3600
+        self.offline = os.getenv("TASAS_OFFLINE") == "1" if offline is None else offline
+        self.tabla = {}
+        if tabla_path and os.path.exists(tabla_path):
+            with open(tabla_path, "r", encoding="utf-8") as f:
+                self.tabla = {m.upper(): t for m, t in json.load(f).items() if not m.startswith("_")}
+        self.consultas = 0
+        self._memo = {}
+        self._locks = {}
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS tasas ("
+            "moneda TEXT NOT NULL, fecha TEXT NOT NULL, usd_rate REAL NOT NULL, fuente TEXT NOT NULL, "
+            "creado REAL NOT NULL, PRIMARY KEY (moneda, fecha))"
+        )
+        self.conn.commit()
+
+    def _leer_cache(self, moneda: str, fecha: str, hoy: bool, vigente: bool = True):
+        if hoy and vigente:
+            fila = self.conn.execute(
+                "SELECT usd_rate FROM tasas WHERE moneda = ? AND fecha = ? AND creado >= ?",
+                (moneda, fecha, time.time() - self.ttl_segundos)
+            ).fetchone()
+        elif not vigente:
+            # La más cercana a la fecha, prefiriendo las anteriores
+            fila = self.conn.execute(
+                "SELECT usd_rate FROM tasas WHERE moneda = ? "
+                "ORDER BY fecha > ?, ABS(julianday(fecha) - julianday(?)), creado DESC LIMIT 1",
+                (moneda, fecha, fecha)
+            ).fetchone()
+        else:
+            fila = self.conn.execute(
+                "SELECT usd_rate FROM tasas WHERE moneda = ? AND fecha = ?", (moneda, fecha)
+            ).fetchone()
+        return fila[0] if fila else None
+
+    def _guardar_cache(self, moneda: str, fecha: str, tasa: float, fuente: str):
+        self.conn.execute(
+            "INSERT OR REPLACE INTO tasas (moneda, fecha, usd_rate, fuente, creado) VALUES (?, ?, ?, ?, ?)",
+            (moneda, fecha, tasa, fuente, time.time())
+        )
+        self.conn.commit()
+
+    async def obtener(self, moneda: str, fecha: str | None = None) -> float:
+        """
+        Tasa USD por unidad de moneda para la fecha (ISO, por defecto hoy).
+        """
+        moneda = (moneda or "").strip().upper()
+        if not moneda:
+            raise ErrorTasaCambio("Moneda vacía")
+        if moneda == "USD":
+            return 1.0
+        hoy = fecha is None
+        fecha = fecha or datetime.date.today().isoformat()
+        clave = (moneda, fecha)
+        if clave in self._memo:
+            return self._memo[clave]
+        lock = self._locks.setdefault(clave, asyncio.Lock())
+        async with lock:
+            if clave not in self._memo:
+                self._memo[clave] = await self._resolver(moneda, fecha, hoy)
+        return self._memo[clave]
+
+    async def _resolver(self, moneda: str, fecha: str, hoy: bool) -> float:
+        tasa = self._leer_cache(moneda, fecha, hoy)
+        if tasa is not None:
+            return tasa
+        error = None
+        if not self.offline and self.consultar is not None:
+            try:
+                self.consultas += 1
+                tasa = _validar(moneda, await self.consultar(moneda, fecha))
+                self._guardar_cache(moneda, fecha, tasa, "modelo")
+                return tasa
+            except Exception as e:
+                error = e
+                print(f"[tasas_cambio] No se pudo consultar {moneda} ({fecha}): {e}")
+        if self.offline and moneda in self.tabla:
+            print(f"[tasas_cambio] Usando la tabla estática para {moneda}")
+            return _validar(moneda, self.tabla[moneda])
+        # Una tasa real de la misma moneda, aunque vencida, es mejor que la tabla estática
+        tasa = self._leer_cache(moneda, fecha, hoy, vigente=False)
+        if tasa is not None:
+            print(f"[tasas_cambio] Usando la tasa guardada más cercana para {moneda}, ya vencida")
+            return tasa
+        if moneda in self.tabla:
+            print(f"[tasas_cambio] Usando la tabla estática para {moneda}")
+            return _validar(moneda, self.tabla[moneda])
+        raise ErrorTasaCambio(f"Sin tasa de cambio para {moneda} ({fecha})") from error
+
+    def cerrar(self):
+        self.conn.close()